@@ -1,6 +1,7 @@
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, get_http_session, close_http_session
 from .weather_agent import WeatherAgent
 from .crop_agent import CropAgent
 from .finance_agent import FinanceAgent
+from .chain import crop_then_finance
 
-__all__ = ['BaseAgent', 'WeatherAgent', 'CropAgent', 'FinanceAgent'] 
\ No newline at end of file
+__all__ = ['BaseAgent', 'get_http_session', 'close_http_session', 'WeatherAgent', 'CropAgent', 'FinanceAgent', 'crop_then_finance'] 
\ No newline at end of file
@@ -1,28 +1,177 @@
+import asyncio
+import re
+import aiohttp
+import orjson
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 from crewai import Agent
 from langchain_openai import ChatOpenAI
 from config import Config
+from .rate_limiter import AsyncLeakyBucket, estimate_tokens
+
+# Tokens reserved for the model's reply on top of the prompt estimate
+COMPLETION_TOKEN_ALLOWANCE = 500
+
+# Number of queries packed into a single prompt by aprocess_queries
+LLM_BATCH_SIZE = 12
+
+BATCH_PROMPT_TEMPLATE = """{backstory}
+
+Answer each of the following farmer questions. Return only a JSON object
+with one key, "answers", holding an array of {count} strings where element i
+is your answer to question Qi.
+
+{questions}"""
+
+SINGLE_PROMPT_TEMPLATE = """{backstory}
+
+Answer the following farmer question concisely.
+
+Question: {query}
+Context: {context}"""
+
+# One bucket per process, and every process that makes LLM calls draws from
+# its own: API workers run streamed (and, without a pool, all) comprehensive
+# crew kickoffs, and each COMPREHENSIVE_QUERY_WORKERS process runs the pooled
+# ones. Each of these processes takes an equal share of the account limits.
+_LLM_PROCESSES = Config.WORKERS * (1 + Config.COMPREHENSIVE_QUERY_WORKERS)
+_llm_bucket = AsyncLeakyBucket(
+    max(1, Config.MAX_REQUESTS_PER_MINUTE // _LLM_PROCESSES),
+    max(1, Config.MAX_TOKENS_PER_MINUTE // _LLM_PROCESSES)
+)
+
+# Process-wide pooled HTTP session shared by all agents so outbound calls
+# reuse keep-alive connections instead of paying a TCP+TLS handshake each time
+_http_session: Optional[aiohttp.ClientSession] = None
+_http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use in the running loop"""
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        if _http_session is not None and not _http_session.closed:
+            _discard_session(_http_session, _http_session_loop)
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=20, ttl_dns_cache=300, keepalive_timeout=60)
+        )
+        _http_session_loop = loop
+    return _http_session
+
+def _discard_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop):
+    """Release a session left over from another event loop without awaiting it"""
+    connector = session.connector
+    session.detach()
+    if connector is None:
+        return
+    if loop.is_closed():
+        # Its transports died with the loop; this only marks the connector closed
+        asyncio.ensure_future(connector.close())
+    else:
+        asyncio.run_coroutine_threadsafe(connector.close(), loop)
+
+async def close_http_session():
+    """Close the shared HTTP session (call on application shutdown)"""
+    global _http_session, _http_session_loop
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    _http_session_loop = None
+
+def extract_json(text: str) -> Any:
+    """Parse JSON from an LLM reply, tolerating a code fence or surrounding prose"""
+    try:
+        return orjson.loads(text)
+    except ValueError:
+        # Body of the first markdown code fence, optionally tagged as json
+        _, fence, rest = text.partition("```")
+        body, closed, _ = rest.partition("```")
+        if fence and closed:
+            if body[:4].lower() == "json":
+                body = body[4:]
+            return orjson.loads(body)
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end < start:
+            raise
+        return orjson.loads(text[start:end + 1])
+
+def dumps(obj: Any) -> bytes:
+    """Serialize an agent response to UTF-8 JSON"""
+    return orjson.dumps(obj, default=str, option=orjson.OPT_NAIVE_UTC)
+
+def _format_context(context: Optional[Dict[str, Any]]) -> str:
+    return dumps(context or {}).decode()
 
 class BaseAgent(ABC):
     """Base class for all agricultural agents"""
     
+    # Name reported in the "source" field of every response
+    SOURCE = "Agent"
+    
+    # Maximum in-flight external calls for this agent (None uses Config.AGENT_CONCURRENCY)
+    CONCURRENCY: Optional[int] = None
+    
+    # Word tokens, including Devanagari vowel signs that \w alone does not match
+    _WORD_RE = re.compile(r"[\w\u0900-\u097F]+")
+    
+    # LLM client shared by every agent instance in the process
+    _SHARED_LLM: Optional[ChatOpenAI] = None
+    
+    # Agent persona, routing keywords and CrewAI tools, defined by each subclass
+    BACKSTORY = ""
+    KEYWORDS: Tuple[str, ...] = ()
+    TOOLS: Tuple = ()
+    
+    # Tokenized KEYWORDS, built once per class when the subclass is defined
+    _KEYWORD_INDEX: Tuple[frozenset, Tuple[int, ...]] = (frozenset(), ())
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._KEYWORD_INDEX = cls._build_keyword_index()
+    
     def __init__(self, name: str, role: str, goal: str):
         self.name = name
         self.role = role
         self.goal = goal
         
         # Initialize LLM only if API key is available
-        if Config.OPENAI_API_KEY:
-            self.llm = ChatOpenAI(
-                model="gpt-4",
+        self.llm = type(self)._get_llm()
+        
+        # Concurrency gate first, rate-limit bucket second
+        self._gate = asyncio.Semaphore(self.CONCURRENCY or Config.AGENT_CONCURRENCY)
+        self._bucket = _llm_bucket
+        self._kw_set, self._kw_ngram_sizes = self._KEYWORD_INDEX
+        
+        self.agent = self._create_agent()
+    
+    @classmethod
+    def _get_llm(cls) -> Optional[ChatOpenAI]:
+        """Return the shared LLM client, creating it on first use"""
+        if BaseAgent._SHARED_LLM is None and Config.OPENAI_API_KEY:
+            BaseAgent._SHARED_LLM = ChatOpenAI(
+                model=Config.LLM_MODEL,
                 temperature=0.7,
-                api_key=Config.OPENAI_API_KEY
+                api_key=Config.OPENAI_API_KEY,
+                timeout=Config.LLM_TIMEOUT,
+                max_retries=2
             )
-        else:
-            self.llm = None
+        return BaseAgent._SHARED_LLM
+    
+    @classmethod
+    def _build_keyword_index(cls) -> Tuple[frozenset, Tuple[int, ...]]:
+        """Tokenize KEYWORDS into a lookup set plus the n-gram sizes to scan
         
-        self.agent = self._create_agent()
+        Multi-word keywords are stored space-joined and matched as n-grams.
+        """
+        keyword_tokens = [tuple(cls._WORD_RE.findall(keyword.lower())) for keyword in cls.KEYWORDS]
+        keyword_set = frozenset(" ".join(tokens) for tokens in keyword_tokens if tokens)
+        ngram_sizes = tuple(sorted({len(tokens) for tokens in keyword_tokens if len(tokens) > 1}))
+        return keyword_set, ngram_sizes
+    
+    @property
+    def http(self) -> aiohttp.ClientSession:
+        """Pooled HTTP session for outbound API calls"""
+        return get_http_session()
     
     def _create_agent(self) -> Agent:
         """Create a CrewAI agent with the specified configuration"""
@@ -33,18 +182,163 @@ class BaseAgent(ABC):
             verbose=True,
             allow_delegation=False,
             llm=self.llm,
-            tools=[]  # No tools for now to avoid validation issues
+            tools=self._get_tools()
         )
     
-    @abstractmethod
     def _get_backstory(self) -> str:
         """Return the backstory for the agent"""
-        pass
+        return self.BACKSTORY
+    
+    def _get_tools(self) -> List:
+        """Return the CrewAI tools for the agent (none for now, to avoid validation issues)"""
+        return list(self.TOOLS)
     
     @abstractmethod
+    def _iter_sections(self, query: str, context: Dict[str, Any] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield the (section, value) pairs that make up the response data"""
+        pass
+    
     def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Process a query and return a response"""
-        pass
+        try:
+            data = dict(self._iter_sections(query, context))
+        except Exception as e:
+            return self._error_response(e)
+        return self._success_response(query, data)
+    
+    async def astream_query(self, query: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield response sections as soon as each one is ready
+        
+        The default implementation advances _iter_sections in a worker thread
+        so blocking steps do not stall the event loop. Errors propagate to the
+        caller; aprocess_query turns them into an error response.
+        """
+        sections = self._iter_sections(query, context)
+        done = object()
+        while True:
+            async with self._gate:
+                item = await asyncio.to_thread(next, sections, done)
+            if item is done:
+                return
+            yield item
+    
+    async def aprocess_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Process a query without blocking the event loop
+        
+        Collects astream_query into the same response shape as process_query,
+        so an orchestrator can await several agents concurrently with asyncio.gather.
+        """
+        try:
+            data = {section: value async for section, value in self.astream_query(query, context)}
+        except Exception as e:
+            return self._error_response(e)
+        return self._success_response(query, data)
+    
+    def _success_response(self, query: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "data": data,
+            "confidence": self.get_confidence_score(query),
+            "source": self.SOURCE
+        }
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(error),
+            "confidence": 0.0,
+            "source": self.SOURCE
+        }
+    
+    async def arun(self, *args, **kwargs) -> Any:
+        """Run the CrewAI agent's synchronous kickoff in a worker thread
+        
+        This keeps the event loop free while the agent runs, but the agent's
+        own tools still execute sequentially inside that thread: any tool that
+        makes a network call must itself be async to truly parallelize.
+        """
+        prompt = " ".join([self._get_backstory(), *map(str, args), *map(str, kwargs.values())])
+        async with self._gate:
+            async with self.reserve_llm(prompt):
+                return await asyncio.to_thread(self.agent.kickoff, *args, **kwargs)
+    
+    def reserve_llm(self, prompt: str, calls: int = 1):
+        """Reserve rate-limit capacity for a number of LLM calls with the given prompt text
+        
+        CrewAI calls the OpenAI client itself, so kickoffs reserve up front:
+        one request per expected call, with a reply allowance for each.
+        """
+        return self._bucket.reserve(estimate_tokens(prompt) + calls * COMPLETION_TOKEN_ALLOWANCE, calls)
+    
+    async def ainvoke_llm(self, prompt: str, json_mode: bool = False) -> str:
+        """Invoke the LLM asynchronously within the configured rate limits
+        
+        With json_mode, models that support it (Config.LLM_JSON_MODE) are asked
+        for a JSON object reply, so extract_json parses it on the first try.
+        """
+        if self.llm is None:
+            raise RuntimeError("LLM is not available (OPENAI_API_KEY not set)")
+        
+        llm = self.llm
+        if json_mode and Config.LLM_JSON_MODE:
+            llm = llm.bind(response_format={"type": "json_object"})
+        
+        async with self._gate:
+            async with self.reserve_llm(prompt):
+                message = await llm.ainvoke(prompt)
+        return message.content
+    
+    async def aprocess_queries(self, queries: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Process several queries, sharing one LLM call per batch of queries
+        
+        Structured data for each query still comes from aprocess_query. When an
+        LLM is available, free-text advice for up to LLM_BATCH_SIZE queries is
+        requested in a single prompt and attached to each result as "advice".
+        """
+        results = list(await asyncio.gather(*(self.aprocess_query(query, context) for query, context in queries)))
+        if self.llm is None:
+            return results
+        
+        for start in range(0, len(queries), LLM_BATCH_SIZE):
+            batch = queries[start:start + LLM_BATCH_SIZE]
+            try:
+                answers = await self._answer_batch(batch)
+            except Exception:
+                continue
+            for result, answer in zip(results[start:start + LLM_BATCH_SIZE], answers):
+                if result.get("success"):
+                    result["data"]["advice"] = answer
+        
+        return results
+    
+    async def _answer_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Answer a batch of queries with one LLM call, falling back to one call per query"""
+        backstory = self._get_backstory()
+        questions = "\n".join(
+            f"Q{i}: {query} (context: {_format_context(context)})"
+            for i, (query, context) in enumerate(batch, 1)
+        )
+        prompt = BATCH_PROMPT_TEMPLATE.format(backstory=backstory, count=len(batch), questions=questions)
+        try:
+            answers = extract_json(await self.ainvoke_llm(prompt, json_mode=True))
+            if isinstance(answers, dict):
+                answers = answers.get("answers")
+            if isinstance(answers, list) and len(answers) == len(batch):
+                return [str(answer) for answer in answers]
+        except ValueError:
+            pass
+        
+        # The batched reply could not be mapped back to the queries
+        return list(await asyncio.gather(*(
+            self.ainvoke_llm(SINGLE_PROMPT_TEMPLATE.format(
+                backstory=backstory, query=query, context=_format_context(context)
+            ))
+            for query, context in batch
+        )))
+    
+    def dumps(self, obj: Any) -> bytes:
+        """Serialize a process_query result for transport or storage"""
+        return dumps(obj)
     
     def validate_input(self, query: str) -> bool:
         """Validate if the query is relevant to this agent"""
@@ -53,12 +347,15 @@ class BaseAgent(ABC):
     def get_confidence_score(self, response: str) -> float:
         """Calculate confidence score for the response"""
         # Simple heuristic - can be improved with more sophisticated methods
-        keywords = self._get_keywords()
-        query_lower = response.lower()
-        matches = sum(1 for keyword in keywords if keyword.lower() in query_lower)
-        return min(matches / len(keywords), 1.0) if keywords else 0.5
+        if not self._kw_set:
+            return 0.5
+        tokens = self._WORD_RE.findall(response.lower())
+        candidates = set(tokens)
+        for size in self._kw_ngram_sizes:
+            candidates.update(" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+        matches = len(candidates & self._kw_set)
+        return min(matches / len(self._kw_set), 1.0)
     
-    @abstractmethod
-    def _get_keywords(self) -> List[str]:
+    def _get_keywords(self) -> Tuple[str, ...]:
         """Return keywords that indicate this agent should handle the query"""
-        pass 
\ No newline at end of file
+        return self.KEYWORDS 
\ No newline at end of file
@@ -0,0 +1,58 @@
+from typing import Dict, Any, Optional
+from .base_agent import extract_json, _format_context
+from .crop_agent import CropAgent
+from .finance_agent import FinanceAgent
+
+CHAIN_PROMPT_TEMPLATE = """You are two cooperating advisors.
+
+Crop advisor: {crop_backstory}
+
+Finance advisor: {finance_backstory}
+
+First, as the crop advisor, choose what the farmer should grow. Then, as the
+finance advisor, explain how to fund that plan. Return only a JSON object with
+two string keys: "crop_plan" and "finance_plan".
+
+Question: {query}
+Context: {context}"""
+
+async def crop_then_finance(query: str, context: Dict[str, Any] = None,
+                            crop_agent: Optional[CropAgent] = None,
+                            finance_agent: Optional[FinanceAgent] = None) -> Dict[str, Any]:
+    """Answer a crop-then-finance question with a single LLM round trip
+
+    Both agents produce their structured data as usual, with the finance step
+    priced for the top recommended crop. Instead of asking the LLM for crop
+    advice and then feeding it into a second finance prompt, one prompt carries
+    both backstories and the two plans are attached to the results as "advice".
+    """
+    crop_agent = crop_agent or CropAgent()
+    finance_agent = finance_agent or FinanceAgent()
+    context = dict(context or {})
+
+    crop_result = await crop_agent.aprocess_query(query, context)
+
+    finance_context = context
+    recommendations = crop_result.get("data", {}).get("recommendations") if crop_result.get("success") else None
+    if recommendations and "crop_type" not in context:
+        finance_context = {**context, "crop_type": recommendations[0]["name"]}
+    finance_result = await finance_agent.aprocess_query(query, finance_context)
+
+    if crop_agent.llm is not None:
+        prompt = CHAIN_PROMPT_TEMPLATE.format(
+            crop_backstory=crop_agent._get_backstory(),
+            finance_backstory=finance_agent._get_backstory(),
+            query=query,
+            context=_format_context(finance_context)
+        )
+        try:
+            plans = extract_json(await crop_agent.ainvoke_llm(prompt, json_mode=True))
+        except Exception as e:
+            print(f"Error generating chained advice: {e}")
+            plans = None
+        if isinstance(plans, dict):
+            for result, key in ((crop_result, "crop_plan"), (finance_result, "finance_plan")):
+                if result.get("success") and key in plans:
+                    result["data"]["advice"] = str(plans[key])
+
+    return {"crop": crop_result, "finance": finance_result}
@@ -1,13 +1,219 @@
-import requests
-import json
-from typing import Dict, Any, List
-from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, AsyncIterator, Iterator, Mapping, Tuple
 from .base_agent import BaseAgent
-from config import Config
+from utils.timestamps import now_iso
+
+# Lookup tables are module-level constants shared by every request. Methods
+# return copies of their records, so a caller that edits a response cannot
+# change the tables or the responses of later requests.
+_LOAN_OPTIONS = (
+    {
+        "name": "Kisan Credit Card (KCC)",
+        "institution": "All Banks",
+        "interest_rate": "7.0%",
+        "max_amount": "₹3,00,000",
+        "tenure": "5 years",
+        "eligibility": "All farmers",
+        "features": ("No collateral for loans up to ₹1.6 lakh", "Flexible repayment", "Crop insurance included")
+    },
+    {
+        "name": "PM-KISAN",
+        "institution": "Government of India",
+        "interest_rate": "0%",
+        "max_amount": "₹6,000/year",
+        "tenure": "Annual",
+        "eligibility": "Small and marginal farmers",
+        "features": ("Direct benefit transfer", "No repayment required", "Three installments per year")
+    },
+    {
+        "name": "Agricultural Term Loan",
+        "institution": "NABARD",
+        "interest_rate": "8.5%",
+        "max_amount": "₹10,00,000",
+        "tenure": "3-7 years",
+        "eligibility": "Farmers with land documents",
+        "features": ("For farm mechanization", "Infrastructure development", "Collateral required")
+    },
+    {
+        "name": "Microfinance Loan",
+        "institution": "MFIs",
+        "interest_rate": "18-24%",
+        "max_amount": "₹50,000",
+        "tenure": "1-2 years",
+        "eligibility": "Small farmers, women farmers",
+        "features": ("Group lending", "Weekly/monthly repayment", "No collateral")
+    }
+)
+
+_SCHEMES = (
+    {
+        "name": "PM Fasal Bima Yojana",
+        "description": "Crop insurance scheme covering yield and weather risks",
+        "coverage": "All food crops, oilseeds, and commercial crops",
+        "premium": "2% for Kharif, 1.5% for Rabi, 5% for commercial crops",
+        "benefits": ("Yield loss coverage", "Weather risk coverage", "Post-harvest losses")
+    },
+    {
+        "name": "PM-KISAN",
+        "description": "Direct income support of ₹6,000 per year to farmers",
+        "coverage": "Small and marginal farmers",
+        "premium": "Free",
+        "benefits": ("Direct bank transfer", "No repayment", "Three installments")
+    },
+    {
+        "name": "Kisan Samman Nidhi",
+        "description": "Pension scheme for small and marginal farmers",
+        "coverage": "Farmers aged 60-80 years",
+        "premium": "₹55-200 per month",
+        "benefits": ("Monthly pension", "Life insurance", "Accident coverage")
+    },
+    {
+        "name": "Soil Health Card Scheme",
+        "description": "Free soil testing and recommendations",
+        "coverage": "All farmers",
+        "premium": "Free",
+        "benefits": ("Soil testing", "Fertilizer recommendations", "Crop-specific advice")
+    }
+)
+
+_STATE_SCHEMES = MappingProxyType({
+    "Maharashtra": (
+        {
+            "name": "Maharashtra Krishi Sanjivani Yojana",
+            "description": "Weather-based crop insurance",
+            "coverage": "All crops in Maharashtra",
+            "premium": "Subsidized rates",
+            "benefits": ("Weather risk coverage", "Quick claim settlement")
+        },
+    ),
+    "Punjab": (
+        {
+            "name": "Punjab Kisan Vikas Yojana",
+            "description": "Support for crop diversification",
+            "coverage": "Farmers switching from paddy",
+            "premium": "Free",
+            "benefits": ("Financial assistance", "Technical support", "Market linkage")
+        },
+    )
+})
+
+_MARKET_DATA = MappingProxyType({
+    "Rice": {
+        "current_price": 1800,
+        "trend": "Stable",
+        "forecast": "Expected to remain stable",
+        "factors": ("Good monsoon", "Government procurement", "Export demand")
+    },
+    "Wheat": {
+        "current_price": 2100,
+        "trend": "Rising",
+        "forecast": "Expected to increase by 5-10%",
+        "factors": ("Reduced production", "Increased demand", "Export opportunities")
+    },
+    "Cotton": {
+        "current_price": 5500,
+        "trend": "Falling",
+        "forecast": "Expected to stabilize",
+        "factors": ("Global price pressure", "Textile industry slowdown")
+    }
+})
+
+_UNKNOWN_TREND = {
+    "current_price": 0,
+    "trend": "Unknown",
+    "forecast": "Data not available",
+    "factors": ()
+}
+
+# Insurance plans with their sum insured per hectare
+_INSURANCE_PLANS = (
+    {
+        "name": "PM Fasal Bima Yojana",
+        "coverage": "Yield loss, weather risk, post-harvest losses",
+        "premium_rate": "2% for Kharif, 1.5% for Rabi",
+        "sum_insured_per_hectare": 50000,
+        "features": ("Government subsidy", "Quick settlement", "Comprehensive coverage")
+    },
+    {
+        "name": "Weather-Based Crop Insurance",
+        "coverage": "Weather-related losses",
+        "premium_rate": "3-5%",
+        "sum_insured_per_hectare": 40000,
+        "features": ("Weather station data", "Automatic settlement", "No crop cutting experiments")
+    },
+    {
+        "name": "Crop Insurance for Horticulture",
+        "coverage": "Fruits and vegetables",
+        "premium_rate": "5-8%",
+        "sum_insured_per_hectare": 60000,
+        "features": ("Specialized coverage", "Market price protection", "Quality loss coverage")
+    }
+)
+
+# Whole rupees with thousands separators, as used for loan eligibility
+_RUPEES_FORMAT = "₹{:,.0f}"
+
+# Loan eligibility multipliers by farmer type and credit history. Unlisted
+# farmer types are treated as large (1.2) and unlisted credit scores as poor (0.7).
+_FARMER_MULT = MappingProxyType({'small': 0.8, 'medium': 1.0, 'large': 1.2})
+_CREDIT_MULT = MappingProxyType({'excellent': 1.2, 'good': 1.0, 'poor': 0.7})
+_ELIGIBILITY_MULT = MappingProxyType({
+    (farmer_type, credit_score): farmer_mult * credit_mult
+    for farmer_type, farmer_mult in _FARMER_MULT.items()
+    for credit_score, credit_mult in _CREDIT_MULT.items()
+})
+
+# Loan shortlists for each farmer profile, filtered once at import
+_LOANS_SMALL = tuple(
+    loan for loan in _LOAN_OPTIONS
+    if loan['name'] in {'Kisan Credit Card (KCC)', 'PM-KISAN', 'Microfinance Loan'}
+)
+_LOANS_MEDIUM = tuple(
+    loan for loan in _LOAN_OPTIONS
+    if loan['name'] in {'Kisan Credit Card (KCC)', 'Agricultural Term Loan'}
+)
+
+# Derived results depend only on their arguments, so they are memoized as
+# read-only records; the agent methods return copies that callers may edit
+@lru_cache(maxsize=256)
+def _government_schemes(state: str) -> Tuple[Mapping[str, Any], ...]:
+    # Add state-specific schemes
+    return _SCHEMES + _STATE_SCHEMES.get(state, ())
+
+# Keyed on land area rounded to 0.1 ha, so nearby areas share an entry
+@lru_cache(maxsize=256)
+def _insurance_options(land_area: float) -> Tuple[Mapping[str, Any], ...]:
+    return tuple(
+        MappingProxyType({
+            "name": plan["name"],
+            "coverage": plan["coverage"],
+            "premium_rate": plan["premium_rate"],
+            "sum_insured": _RUPEES_FORMAT.format(land_area * plan["sum_insured_per_hectare"]),
+            "features": plan["features"]
+        })
+        for plan in _INSURANCE_PLANS
+    )
 
 class FinanceAgent(BaseAgent):
     """Agent specialized in agricultural finance and government schemes"""
     
+    SOURCE = "Finance Agent"
+    CONCURRENCY = 10  # LLM-bound
+    
+    BACKSTORY = """You are a senior agricultural finance expert with extensive experience in 
+        rural banking, government schemes, and agricultural economics. You understand the 
+        financial challenges faced by Indian farmers and provide practical advice on loans, 
+        subsidies, insurance, and market opportunities. You have deep knowledge of both 
+        government and private sector financial products for agriculture."""
+    
+    KEYWORDS = (
+        "loan", "credit", "finance", "money", "bank", "scheme", "subsidy",
+        "insurance", "market", "price", "profit", "investment", "budget",
+        "ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना", "सब्सिडी",
+        "बीमा", "बाजार", "कीमत", "लाभ", "निवेश", "बजट"
+    )
+    
     def __init__(self):
         super().__init__(
             name="Finance Advisor",
@@ -15,260 +221,76 @@ class FinanceAgent(BaseAgent):
             goal="Provide comprehensive financial advice including loans, government schemes, and market insights"
         )
     
-    def _get_backstory(self) -> str:
-        return """You are a senior agricultural finance expert with extensive experience in 
-        rural banking, government schemes, and agricultural economics. You understand the 
-        financial challenges faced by Indian farmers and provide practical advice on loans, 
-        subsidies, insurance, and market opportunities. You have deep knowledge of both 
-        government and private sector financial products for agriculture."""
-    
-    def _get_keywords(self) -> List[str]:
-        return [
-            "loan", "credit", "finance", "money", "bank", "scheme", "subsidy",
-            "insurance", "market", "price", "profit", "investment", "budget",
-            "ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना", "सब्सिडी",
-            "बीमा", "बाजार", "कीमत", "लाभ", "निवेश", "बजट"
-        ]
+    def _iter_sections(self, query: str, context: Dict[str, Any] = None) -> Iterator[Tuple[str, Any]]:
+        """Build the finance response one section at a time"""
+        # Extract parameters from context
+        farmer_type = context.get('farmer_type', 'small') if context else 'small'
+        land_area = context.get('land_area', 2)  # in hectares
+        crop_type = context.get('crop_type', 'general')
+        state = context.get('state', 'Maharashtra')
+        
+        # Get loan options
+        yield "loan_options", self.get_loan_options(farmer_type, land_area, crop_type)
+        
+        # Get government schemes
+        yield "government_schemes", self.get_government_schemes(state, farmer_type)
+        
+        # Analyze market trends
+        yield "market_analysis", self.analyze_market_trends(crop_type)
+        
+        # Get insurance options
+        yield "insurance_options", self.get_insurance_options(crop_type, land_area)
+        
+        # Calculate loan eligibility
+        yield "loan_eligibility", self.calculate_loan_eligibility(farmer_type, land_area, context)
+        
+        yield "timestamp", now_iso()
     
-    def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Process finance-related queries"""
-        try:
-            # Extract parameters from context
-            farmer_type = context.get('farmer_type', 'small') if context else 'small'
-            land_area = context.get('land_area', 2)  # in hectares
-            crop_type = context.get('crop_type', 'general')
-            state = context.get('state', 'Maharashtra')
-            
-            # Get loan options
-            loans = self.get_loan_options(farmer_type, land_area, crop_type)
-            
-            # Get government schemes
-            schemes = self.get_government_schemes(state, farmer_type)
-            
-            # Analyze market trends
-            market_analysis = self.analyze_market_trends(crop_type)
-            
-            # Get insurance options
-            insurance = self.get_insurance_options(crop_type, land_area)
-            
-            # Calculate loan eligibility
-            eligibility = self.calculate_loan_eligibility(farmer_type, land_area, context)
-            
-            response = {
-                "loan_options": loans,
-                "government_schemes": schemes,
-                "market_analysis": market_analysis,
-                "insurance_options": insurance,
-                "loan_eligibility": eligibility,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            return {
-                "success": True,
-                "data": response,
-                "confidence": self.get_confidence_score(query),
-                "source": "Finance Agent"
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "confidence": 0.0,
-                "source": "Finance Agent"
-            }
+    async def astream_query(self, query: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream finance response sections on the event loop
+        
+        Every step is an in-memory lookup with no I/O to overlap, so running
+        them inline is cheaper than the base class's worker-thread hop.
+        """
+        for section in self._iter_sections(query, context):
+            yield section
     
-    def get_loan_options(self, farmer_type: str, land_area: float, crop_type: str) -> List[Dict[str, Any]]:
+    def get_loan_options(self, farmer_type: str, land_area: float, crop_type: str) -> Tuple[Dict[str, Any], ...]:
         """Get available loan options for farmers"""
-        loan_options = [
-            {
-                "name": "Kisan Credit Card (KCC)",
-                "institution": "All Banks",
-                "interest_rate": "7.0%",
-                "max_amount": "₹3,00,000",
-                "tenure": "5 years",
-                "eligibility": "All farmers",
-                "features": ["No collateral for loans up to ₹1.6 lakh", "Flexible repayment", "Crop insurance included"]
-            },
-            {
-                "name": "PM-KISAN",
-                "institution": "Government of India",
-                "interest_rate": "0%",
-                "max_amount": "₹6,000/year",
-                "tenure": "Annual",
-                "eligibility": "Small and marginal farmers",
-                "features": ["Direct benefit transfer", "No repayment required", "Three installments per year"]
-            },
-            {
-                "name": "Agricultural Term Loan",
-                "institution": "NABARD",
-                "interest_rate": "8.5%",
-                "max_amount": "₹10,00,000",
-                "tenure": "3-7 years",
-                "eligibility": "Farmers with land documents",
-                "features": ["For farm mechanization", "Infrastructure development", "Collateral required"]
-            },
-            {
-                "name": "Microfinance Loan",
-                "institution": "MFIs",
-                "interest_rate": "18-24%",
-                "max_amount": "₹50,000",
-                "tenure": "1-2 years",
-                "eligibility": "Small farmers, women farmers",
-                "features": ["Group lending", "Weekly/monthly repayment", "No collateral"]
-            }
-        ]
-        
         # Filter based on farmer type and land area
         if farmer_type == 'small' and land_area < 2:
-            return [loan for loan in loan_options if loan['name'] in ['Kisan Credit Card (KCC)', 'PM-KISAN', 'Microfinance Loan']]
+            loans = _LOANS_SMALL
         elif farmer_type == 'medium' and 2 <= land_area <= 10:
-            return [loan for loan in loan_options if loan['name'] in ['Kisan Credit Card (KCC)', 'Agricultural Term Loan']]
+            loans = _LOANS_MEDIUM
         else:
-            return loan_options
+            loans = _LOAN_OPTIONS
+        return tuple(dict(loan) for loan in loans)
     
-    def get_government_schemes(self, state: str, farmer_type: str) -> List[Dict[str, Any]]:
+    def get_government_schemes(self, state: str, farmer_type: str) -> Tuple[Dict[str, Any], ...]:
         """Get relevant government schemes"""
-        schemes = [
-            {
-                "name": "PM Fasal Bima Yojana",
-                "description": "Crop insurance scheme covering yield and weather risks",
-                "coverage": "All food crops, oilseeds, and commercial crops",
-                "premium": "2% for Kharif, 1.5% for Rabi, 5% for commercial crops",
-                "benefits": ["Yield loss coverage", "Weather risk coverage", "Post-harvest losses"]
-            },
-            {
-                "name": "PM-KISAN",
-                "description": "Direct income support of ₹6,000 per year to farmers",
-                "coverage": "Small and marginal farmers",
-                "premium": "Free",
-                "benefits": ["Direct bank transfer", "No repayment", "Three installments"]
-            },
-            {
-                "name": "Kisan Samman Nidhi",
-                "description": "Pension scheme for small and marginal farmers",
-                "coverage": "Farmers aged 60-80 years",
-                "premium": "₹55-200 per month",
-                "benefits": ["Monthly pension", "Life insurance", "Accident coverage"]
-            },
-            {
-                "name": "Soil Health Card Scheme",
-                "description": "Free soil testing and recommendations",
-                "coverage": "All farmers",
-                "premium": "Free",
-                "benefits": ["Soil testing", "Fertilizer recommendations", "Crop-specific advice"]
-            }
-        ]
-        
-        # Add state-specific schemes
-        state_schemes = {
-            "Maharashtra": [
-                {
-                    "name": "Maharashtra Krishi Sanjivani Yojana",
-                    "description": "Weather-based crop insurance",
-                    "coverage": "All crops in Maharashtra",
-                    "premium": "Subsidized rates",
-                    "benefits": ["Weather risk coverage", "Quick claim settlement"]
-                }
-            ],
-            "Punjab": [
-                {
-                    "name": "Punjab Kisan Vikas Yojana",
-                    "description": "Support for crop diversification",
-                    "coverage": "Farmers switching from paddy",
-                    "premium": "Free",
-                    "benefits": ["Financial assistance", "Technical support", "Market linkage"]
-                }
-            ]
-        }
-        
-        schemes.extend(state_schemes.get(state, []))
-        return schemes
+        return tuple(dict(scheme) for scheme in _government_schemes(state))
     
     def analyze_market_trends(self, crop_type: str) -> Dict[str, Any]:
         """Analyze market trends for agricultural products"""
         # This would integrate with real-time market data
-        market_data = {
-            "Rice": {
-                "current_price": 1800,
-                "trend": "Stable",
-                "forecast": "Expected to remain stable",
-                "factors": ["Good monsoon", "Government procurement", "Export demand"]
-            },
-            "Wheat": {
-                "current_price": 2100,
-                "trend": "Rising",
-                "forecast": "Expected to increase by 5-10%",
-                "factors": ["Reduced production", "Increased demand", "Export opportunities"]
-            },
-            "Cotton": {
-                "current_price": 5500,
-                "trend": "Falling",
-                "forecast": "Expected to stabilize",
-                "factors": ["Global price pressure", "Textile industry slowdown"]
-            }
-        }
-        
-        return market_data.get(crop_type, {
-            "current_price": 0,
-            "trend": "Unknown",
-            "forecast": "Data not available",
-            "factors": []
-        })
+        return dict(_MARKET_DATA.get(crop_type, _UNKNOWN_TREND))
     
-    def get_insurance_options(self, crop_type: str, land_area: float) -> List[Dict[str, Any]]:
+    def get_insurance_options(self, crop_type: str, land_area: float) -> Tuple[Dict[str, Any], ...]:
         """Get crop insurance options"""
-        insurance_options = [
-            {
-                "name": "PM Fasal Bima Yojana",
-                "coverage": "Yield loss, weather risk, post-harvest losses",
-                "premium_rate": "2% for Kharif, 1.5% for Rabi",
-                "sum_insured": f"₹{land_area * 50000}",
-                "features": ["Government subsidy", "Quick settlement", "Comprehensive coverage"]
-            },
-            {
-                "name": "Weather-Based Crop Insurance",
-                "coverage": "Weather-related losses",
-                "premium_rate": "3-5%",
-                "sum_insured": f"₹{land_area * 40000}",
-                "features": ["Weather station data", "Automatic settlement", "No crop cutting experiments"]
-            },
-            {
-                "name": "Crop Insurance for Horticulture",
-                "coverage": "Fruits and vegetables",
-                "premium_rate": "5-8%",
-                "sum_insured": f"₹{land_area * 60000}",
-                "features": ["Specialized coverage", "Market price protection", "Quality loss coverage"]
-            }
-        ]
-        
-        return insurance_options
+        return tuple(dict(option) for option in _insurance_options(round(land_area, 1)))
     
     def calculate_loan_eligibility(self, farmer_type: str, land_area: float, context: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate loan eligibility for farmers"""
-        base_amount = land_area * 50000  # ₹50,000 per hectare
-        
-        # Adjust based on farmer type
-        if farmer_type == 'small':
-            multiplier = 0.8
-        elif farmer_type == 'medium':
-            multiplier = 1.0
-        else:  # large
-            multiplier = 1.2
-        
-        # Adjust based on credit history
         credit_score = context.get('credit_score', 'good')
-        if credit_score == 'excellent':
-            credit_multiplier = 1.2
-        elif credit_score == 'good':
-            credit_multiplier = 1.0
-        else:
-            credit_multiplier = 0.7
         
-        eligible_amount = base_amount * multiplier * credit_multiplier
+        # ₹50,000 per hectare, adjusted for farmer type and credit history
+        multiplier = _ELIGIBILITY_MULT.get((farmer_type, credit_score))
+        if multiplier is None:
+            multiplier = _FARMER_MULT.get(farmer_type, 1.2) * _CREDIT_MULT.get(credit_score, 0.7)
+        eligible_amount = land_area * 50000 * multiplier
         
         return {
-            "eligible_amount": f"₹{eligible_amount:,.0f}",
+            "eligible_amount": _RUPEES_FORMAT.format(eligible_amount),
             "factors": [
                 f"Land area: {land_area} hectares",
                 f"Farmer type: {farmer_type}",
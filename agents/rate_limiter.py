@@ -0,0 +1,68 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+class AsyncLeakyBucket:
+    """Token bucket that keeps request and token throughput under per-minute limits
+
+    Callers reserve capacity before each LLM call, so concurrent queries queue
+    just below the account's RPM/TPM ceiling instead of running into 429s.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._available_requests = float(rpm)
+        self._available_tokens = float(tpm)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Top up both buckets for the time elapsed since the last refill"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._available_requests = min(self.rpm, self._available_requests + elapsed * self.rpm / 60)
+        self._available_tokens = min(self.tpm, self._available_tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int, requests: int = 1):
+        """Wait until the given numbers of requests and tokens are available"""
+        tokens = min(tokens, self.tpm)
+        requests = min(requests, self.rpm)
+        # Waiters queue on the lock, so capacity is handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._available_requests >= requests and self._available_tokens >= tokens:
+                    self._available_requests -= requests
+                    self._available_tokens -= tokens
+                    return
+                wait = max(
+                    (requests - self._available_requests) * 60 / self.rpm,
+                    (tokens - self._available_tokens) * 60 / self.tpm
+                )
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def reserve(self, tokens: int, requests: int = 1):
+        """Reserve capacity for a number of calls totalling roughly the given token size"""
+        await self.acquire(tokens, requests)
+        yield
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the GPT-4 tokenizer once, or None if it is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4")
+    except Exception:
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a prompt"""
+    encoding = _get_encoding()
+    if encoding is None:
+        # Rough fallback: ~4 characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
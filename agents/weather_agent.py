@@ -1,106 +1,330 @@
+import asyncio
+import orjson
 import requests
-import json
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
-from .base_agent import BaseAgent
+from bisect import bisect_left
+from contextlib import nullcontext
+from types import MappingProxyType
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from .base_agent import BaseAgent, get_http_session
+from utils.timestamps import now_iso
 from config import Config
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
+
+# Returned when no OpenWeather API key is configured. Stored as JSON bytes,
+# like the cached responses, so every caller decodes its own copy.
+_MOCK_CURRENT_WEATHER = orjson.dumps({
+    "temperature": 28.5,
+    "humidity": 65,
+    "description": "partly cloudy",
+    "wind_speed": 5.2,
+    "pressure": 1013
+})
+
+_MOCK_FORECAST = orjson.dumps({
+    "forecast": [
+        {
+            "time": "2024-01-15 12:00:00",
+            "temperature": 28.5,
+            "humidity": 65,
+            "description": "partly cloudy",
+            "rainfall": 0
+        },
+        {
+            "time": "2024-01-15 15:00:00",
+            "temperature": 30.2,
+            "humidity": 60,
+            "description": "clear sky",
+            "rainfall": 0
+        }
+    ]
+})
+
+# Irrigation levels from least to most urgent, as (priority, recommendation)
+_IRRIGATION_LEVELS = (
+    ("Low", "Low irrigation needed - favorable conditions"),
+    ("Medium", "Moderate irrigation recommended"),
+    ("High", "High irrigation needed - high temperature and low humidity")
+)
+
+# Next irrigation window for temperatures up to 25°C, up to 30°C, and above 30°C
+_NEXT_IRRIGATION_TEMPS = (25, 30)
+_NEXT_IRRIGATION_WINDOWS = ("Within 72 hours", "Within 48 hours", "Within 24 hours")
+
+def _irrigation_level(temp: float, humidity: float) -> int:
+    """Index into _IRRIGATION_LEVELS; the High band lies inside the Medium one"""
+    return (temp > 25 and humidity < 60) + (temp > 30 and humidity < 50)
+
+# (connect, read) timeout in seconds for synchronous OpenWeather calls
+_REQUEST_TIMEOUT = (3, 10)
+
+# Upstream statuses worth retrying (rate limiting and transient server errors)
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Attempts per async call, base backoff in seconds, and the longest Retry-After we honor
+_RETRY_ATTEMPTS = 3
+_RETRY_BACKOFF = 0.2
+_MAX_RETRY_AFTER = 10
+
+def _retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Seconds to wait before the next attempt, preferring the server's Retry-After"""
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), _MAX_RETRY_AFTER)
+    return _RETRY_BACKOFF * 2 ** attempt
+
+async def _aget_json(url: str, params: Dict[str, Any], gate=None) -> Any:
+    """GET a JSON body, retrying 429/5xx responses with exponential backoff
+    
+    The optional semaphore is held per attempt, not while backing off.
+    """
+    for attempt in range(_RETRY_ATTEMPTS):
+        async with gate or nullcontext():
+            async with get_http_session().get(url, params=params) as response:
+                if response.status not in _RETRY_STATUSES or attempt == _RETRY_ATTEMPTS - 1:
+                    response.raise_for_status()
+                    return orjson.loads(await response.read())
+                delay = _retry_delay(response.headers.get("Retry-After"), attempt)
+        await asyncio.sleep(delay)
+
+def _create_session() -> requests.Session:
+    """Pooled session so repeated lookups reuse keep-alive connections"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.2, status_forcelist=_RETRY_STATUSES, respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _cache_key(location: str) -> str:
+    return location.lower().strip()
+
+# OpenWeather endpoints and the query parameters shared by every request
+_CURRENT_URL = f"{Config.WEATHER_BASE_URL}/weather"
+_FORECAST_URL = f"{Config.WEATHER_BASE_URL}/forecast"
+_GROUP_URL = f"{Config.WEATHER_BASE_URL}/group"
+_BASE_PARAMS = MappingProxyType({'appid': Config.WEATHER_API_KEY, 'units': 'metric'})
+
+def _query_params(location: str) -> Dict[str, str]:
+    return {'q': location, **_BASE_PARAMS}
+
+def _parse_current_weather(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "temperature": data['main']['temp'],
+        "humidity": data['main']['humidity'],
+        "description": data['weather'][0]['description'],
+        "wind_speed": data['wind']['speed'],
+        "pressure": data['main']['pressure']
+    }
+
+def _parse_forecast(data: Dict[str, Any]) -> Dict[str, Any]:
+    forecast = []
+    
+    for item in data['list'][:8]:  # Next 24 hours (3-hour intervals)
+        forecast.append({
+            "time": item['dt_txt'],
+            "temperature": item['main']['temp'],
+            "humidity": item['main']['humidity'],
+            "description": item['weather'][0]['description'],
+            "rainfall": item.get('rain', {}).get('3h', 0)
+        })
+    
+    return {"forecast": forecast}
+
+# OpenWeather's /group endpoint returns current weather for up to 20 city IDs
+GROUP_BATCH_SIZE = 20
+
+# How long to collect lookups before issuing the /group calls, in seconds
+GROUP_BATCH_WINDOW = 0.05
+
+class _GroupBatcher:
+    """Coalesce concurrent current-weather lookups into /group calls
+    
+    The first lookup schedules a flush (right away when no batch is in
+    flight, otherwise after a short window); every lookup that arrives before
+    it shares the same batch. Each caller receives the raw /weather-shaped
+    entry for its own city ID, or an exception if /group failed or omitted it.
+    """
+    
+    def __init__(self):
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def fetch(self, city_id: int) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending = {}
+            self._loop = loop
+            self._flush_task = None
+        
+        future = self._pending.get(city_id)
+        if future is None:
+            if not self._pending:
+                if self._flush_task is None or self._flush_task.done():
+                    # Nothing in flight: flush on the next loop iteration, so a
+                    # lone lookup does not wait out the window while lookups
+                    # started in the same tick still share a batch
+                    loop.call_soon(self._start_flush)
+                else:
+                    loop.call_later(GROUP_BATCH_WINDOW, self._start_flush)
+            future = self._pending[city_id] = loop.create_future()
+        # Shielded so one cancelled caller does not fail the others sharing the ID
+        return await asyncio.shield(future)
+    
+    def _start_flush(self):
+        self._flush_task = self._loop.create_task(self._flush())
+    
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        city_ids = list(pending)
+        await asyncio.gather(*(
+            self._fetch_group(city_ids[start:start + GROUP_BATCH_SIZE], pending)
+            for start in range(0, len(city_ids), GROUP_BATCH_SIZE)
+        ))
+    
+    async def _fetch_group(self, city_ids: List[int], pending: Dict[int, asyncio.Future]):
+        params = {'id': ",".join(str(city_id) for city_id in city_ids), **_BASE_PARAMS}
+        try:
+            data = await _aget_json(_GROUP_URL, params)
+            entries = {entry['id']: entry for entry in data.get('list', [])}
+        except Exception as e:
+            for city_id in city_ids:
+                if not pending[city_id].done():
+                    pending[city_id].set_exception(e)
+            return
+        
+        for city_id in city_ids:
+            future = pending[city_id]
+            if future.done():
+                continue
+            if city_id in entries:
+                future.set_result(entries[city_id])
+            else:
+                future.set_exception(KeyError(f"City {city_id} missing from group response"))
 
 class WeatherAgent(BaseAgent):
     """Agent specialized in weather analysis and irrigation recommendations"""
     
-    def __init__(self):
-        super().__init__(
-            name="Weather Expert",
-            role="Agricultural Weather Specialist",
-            goal="Provide accurate weather forecasts and irrigation recommendations for optimal crop growth"
-        )
+    SOURCE = "Weather Agent"
+    CONCURRENCY = 20  # OpenWeather lookups in flight per agent
     
-    def _get_backstory(self) -> str:
-        return """You are an expert agricultural meteorologist with 15 years of experience in 
+    BACKSTORY = """You are an expert agricultural meteorologist with 15 years of experience in 
         analyzing weather patterns for Indian agriculture. You understand the specific weather 
         needs of different crops, soil types, and regions across India. You provide practical 
         advice on irrigation timing, crop protection from weather extremes, and optimal farming 
         practices based on weather conditions."""
     
-    def _get_tools(self) -> List:
-        # Return empty list to avoid tool validation issues
-        return []
+    KEYWORDS = (
+        "weather", "temperature", "rain", "irrigation", "humidity", "forecast",
+        "drought", "flood", "monsoon", "season", "climate", "moisture",
+        "पानी", "मौसम", "सिंचाई", "बारिश", "तापमान", "नमी"
+    )
     
-    def _get_keywords(self) -> List[str]:
-        return [
-            "weather", "temperature", "rain", "irrigation", "humidity", "forecast",
-            "drought", "flood", "monsoon", "season", "climate", "moisture",
-            "पानी", "मौसम", "सिंचाई", "बारिश", "तापमान", "नमी"
-        ]
+    # HTTP session shared by every instance for the synchronous getters
+    _session = _create_session()
     
-    def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Process weather-related queries"""
-        try:
-            # Extract location from context or query
-            location = context.get('location', 'Mumbai') if context else 'Mumbai'
-            
-            # Get current weather
-            current_weather = self.get_current_weather(location)
-            
-            # Get forecast
-            forecast = self.get_weather_forecast(location)
-            
-            # Analyze irrigation needs
-            irrigation_advice = self.analyze_irrigation_needs(current_weather, forecast)
-            
-            response = {
-                "current_weather": current_weather,
-                "forecast": forecast,
-                "irrigation_recommendation": irrigation_advice,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            return {
-                "success": True,
-                "data": response,
-                "confidence": self.get_confidence_score(query),
-                "source": "Weather Agent"
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "confidence": 0.0,
-                "source": "Weather Agent"
-            }
+    # OpenWeather city IDs learned from /weather responses, keyed by normalized
+    # location, so later lookups for the same place can be batched via /group
+    _city_ids: Dict[str, int] = {}
+    _group_batcher = _GroupBatcher()
+    
+    # Concurrent async lookups for the same location share one upstream call
+    _inflight = SingleFlight()
+    
+    # Parsed OpenWeather responses shared by every instance, keyed by normalized
+    # location. They are stored serialized and each caller decodes its own copy,
+    # so no caller can alter what the others see.
+    _current_cache = TTLCache(maxsize=1024, ttl=Config.WEATHER_CURRENT_TTL)
+    _forecast_cache = TTLCache(maxsize=1024, ttl=Config.WEATHER_FORECAST_TTL)
+    
+    def __init__(self):
+        super().__init__(
+            name="Weather Expert",
+            role="Agricultural Weather Specialist",
+            goal="Provide accurate weather forecasts and irrigation recommendations for optimal crop growth"
+        )
+    
+    def _iter_sections(self, query: str, context: Dict[str, Any] = None) -> Iterator[Tuple[str, Any]]:
+        """Build the weather response one section at a time"""
+        # Extract location from context or query
+        location = context.get('location', 'Mumbai') if context else 'Mumbai'
+        
+        # Get current weather
+        current_weather = self.get_current_weather(location)
+        yield "current_weather", current_weather
+        
+        # Get forecast
+        forecast = self.get_weather_forecast(location)
+        yield "forecast", forecast
+        
+        # Analyze irrigation needs
+        yield "irrigation_recommendation", self.analyze_irrigation_needs(current_weather, forecast)
+        
+        yield "timestamp", now_iso()
+    
+    async def astream_query(self, query: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream weather response sections as each lookup completes
+        
+        Current conditions and the forecast are fetched concurrently, and
+        whichever arrives first is yielded first. A failed lookup yields an
+        error section, like the sync getters do. The irrigation advice needs
+        both, so it follows them.
+        """
+        location = context.get('location', 'Mumbai') if context else 'Mumbai'
+        
+        async def fetch(section, lookup):
+            # A failed lookup must not take the other one down with it
+            try:
+                return section, await lookup(location)
+            except Exception as e:
+                return section, {"error": f"Failed to fetch {section}: {str(e)}"}
+        
+        sections = {}
+        for next_done in asyncio.as_completed([
+            fetch("current_weather", self.aget_current_weather),
+            fetch("forecast", self.aget_weather_forecast)
+        ]):
+            section, value = await next_done
+            sections[section] = value
+            yield section, value
+        
+        yield "irrigation_recommendation", self.analyze_irrigation_needs(sections["current_weather"], sections["forecast"])
+        yield "timestamp", now_iso()
     
     def get_current_weather(self, location: str) -> Dict[str, Any]:
         """Get current weather data for a location"""
         try:
             # If no API key, return mock data
             if not Config.WEATHER_API_KEY:
-                return {
-                    "temperature": 28.5,
-                    "humidity": 65,
-                    "description": "partly cloudy",
-                    "wind_speed": 5.2,
-                    "pressure": 1013
-                }
+                return orjson.loads(_MOCK_CURRENT_WEATHER)
             
-            url = f"{Config.WEATHER_BASE_URL}/weather"
-            params = {
-                'q': location,
-                'appid': Config.WEATHER_API_KEY,
-                'units': 'metric'
-            }
+            cached = self._current_cache.get(_cache_key(location))
+            if cached is not None:
+                return orjson.loads(cached)
             
-            response = requests.get(url, params=params)
+            response = self._session.get(_CURRENT_URL, params=_query_params(location), timeout=_REQUEST_TIMEOUT)
             response.raise_for_status()
             
-            data = response.json()
-            return {
-                "temperature": data['main']['temp'],
-                "humidity": data['main']['humidity'],
-                "description": data['weather'][0]['description'],
-                "wind_speed": data['wind']['speed'],
-                "pressure": data['main']['pressure']
-            }
+            data = orjson.loads(response.content)
+            self._remember_city_id(location, data)
+            result = _parse_current_weather(data)
+            self._current_cache.set(_cache_key(location), orjson.dumps(result))
+            return result
+        except Exception as e:
+            return {"error": f"Failed to fetch weather data: {str(e)}"}
+    
+    async def aget_current_weather(self, location: str) -> Dict[str, Any]:
+        """Get current weather data without blocking the event loop"""
+        try:
+            if not Config.WEATHER_API_KEY:
+                return orjson.loads(_MOCK_CURRENT_WEATHER)
+            
+            cached = self._current_cache.get(_cache_key(location))
+            if cached is None:
+                cached = await self._inflight.do(("weather", _cache_key(location)), lambda: self._afetch_current_weather(location))
+            return orjson.loads(cached)
         except Exception as e:
             return {"error": f"Failed to fetch weather data: {str(e)}"}
     
@@ -109,66 +333,79 @@ class WeatherAgent(BaseAgent):
         try:
             # If no API key, return mock data
             if not Config.WEATHER_API_KEY:
-                return {
-                    "forecast": [
-                        {
-                            "time": "2024-01-15 12:00:00",
-                            "temperature": 28.5,
-                            "humidity": 65,
-                            "description": "partly cloudy",
-                            "rainfall": 0
-                        },
-                        {
-                            "time": "2024-01-15 15:00:00",
-                            "temperature": 30.2,
-                            "humidity": 60,
-                            "description": "clear sky",
-                            "rainfall": 0
-                        }
-                    ]
-                }
+                return orjson.loads(_MOCK_FORECAST)
             
-            url = f"{Config.WEATHER_BASE_URL}/forecast"
-            params = {
-                'q': location,
-                'appid': Config.WEATHER_API_KEY,
-                'units': 'metric'
-            }
+            cached = self._forecast_cache.get(_cache_key(location))
+            if cached is not None:
+                return orjson.loads(cached)
             
-            response = requests.get(url, params=params)
+            response = self._session.get(_FORECAST_URL, params=_query_params(location), timeout=_REQUEST_TIMEOUT)
             response.raise_for_status()
             
-            data = response.json()
-            forecast = []
-            
-            for item in data['list'][:8]:  # Next 24 hours (3-hour intervals)
-                forecast.append({
-                    "time": item['dt_txt'],
-                    "temperature": item['main']['temp'],
-                    "humidity": item['main']['humidity'],
-                    "description": item['weather'][0]['description'],
-                    "rainfall": item.get('rain', {}).get('3h', 0)
-                })
+            result = _parse_forecast(orjson.loads(response.content))
+            self._forecast_cache.set(_cache_key(location), orjson.dumps(result))
+            return result
+        except Exception as e:
+            return {"error": f"Failed to fetch forecast: {str(e)}"}
+    
+    async def aget_weather_forecast(self, location: str) -> Dict[str, Any]:
+        """Get 5-day weather forecast without blocking the event loop"""
+        try:
+            if not Config.WEATHER_API_KEY:
+                return orjson.loads(_MOCK_FORECAST)
             
-            return {"forecast": forecast}
+            cached = self._forecast_cache.get(_cache_key(location))
+            if cached is None:
+                cached = await self._inflight.do(("forecast", _cache_key(location)), lambda: self._afetch_weather_forecast(location))
+            return orjson.loads(cached)
         except Exception as e:
             return {"error": f"Failed to fetch forecast: {str(e)}"}
     
+    async def _afetch_current_weather(self, location: str) -> bytes:
+        data = None
+        city_id = self._city_ids.get(_cache_key(location))
+        if city_id is not None:
+            try:
+                data = await self._group_batcher.fetch(city_id)
+            except Exception as e:
+                # /group failed or left the city out; a single lookup may still work
+                print(f"Batched weather lookup for {location} failed, retrying alone: {e}")
+        if data is None:
+            data = await _aget_json(_CURRENT_URL, _query_params(location), self._gate)
+            self._remember_city_id(location, data)
+        
+        frozen = orjson.dumps(_parse_current_weather(data))
+        self._current_cache.set(_cache_key(location), frozen)
+        return frozen
+    
+    async def _afetch_weather_forecast(self, location: str) -> bytes:
+        data = await _aget_json(_FORECAST_URL, _query_params(location), self._gate)
+        frozen = orjson.dumps(_parse_forecast(data))
+        self._forecast_cache.set(_cache_key(location), frozen)
+        return frozen
+    
+    @classmethod
+    def _remember_city_id(cls, location: str, data: Dict[str, Any]):
+        if 'id' in data:
+            cls._city_ids[_cache_key(location)] = data['id']
+    
+    @classmethod
+    def invalidate_cache(cls, location: str = None):
+        """Drop cached weather for one location, or for every location"""
+        if location is None:
+            cls._current_cache.clear()
+            cls._forecast_cache.clear()
+        else:
+            cls._current_cache.pop(_cache_key(location))
+            cls._forecast_cache.pop(_cache_key(location))
+    
     def analyze_irrigation_needs(self, current_weather: Dict, forecast: Dict) -> Dict[str, Any]:
         """Analyze irrigation needs based on weather data"""
         temp = current_weather.get('temperature', 25)
         humidity = current_weather.get('humidity', 60)
         
         # Simple irrigation logic (can be enhanced with crop-specific data)
-        if temp > 30 and humidity < 50:
-            recommendation = "High irrigation needed - high temperature and low humidity"
-            priority = "High"
-        elif temp > 25 and humidity < 60:
-            recommendation = "Moderate irrigation recommended"
-            priority = "Medium"
-        else:
-            recommendation = "Low irrigation needed - favorable conditions"
-            priority = "Low"
+        priority, recommendation = _IRRIGATION_LEVELS[_irrigation_level(temp, humidity)]
         
         return {
             "recommendation": recommendation,
@@ -177,16 +414,21 @@ class WeatherAgent(BaseAgent):
             "next_irrigation": self._calculate_next_irrigation(current_weather, forecast)
         }
     
+    def plan_irrigation_horizon(self, forecast: Dict) -> List[Dict[str, Any]]:
+        """Irrigation priority for each interval of the forecast horizon"""
+        plan = []
+        for step in forecast.get('forecast', ()):
+            priority, recommendation = _IRRIGATION_LEVELS[
+                _irrigation_level(step.get('temperature', 25), step.get('humidity', 60))
+            ]
+            plan.append({"time": step.get('time'), "priority": priority, "recommendation": recommendation})
+        return plan
+    
     def _calculate_next_irrigation(self, current_weather: Dict, forecast: Dict) -> str:
         """Calculate when next irrigation should be done"""
         # Simple logic - can be enhanced with soil moisture sensors
         temp = current_weather.get('temperature', 25)
-        if temp > 30:
-            return "Within 24 hours"
-        elif temp > 25:
-            return "Within 48 hours"
-        else:
-            return "Within 72 hours"
+        return _NEXT_IRRIGATION_WINDOWS[bisect_left(_NEXT_IRRIGATION_TEMPS, temp)]
     
     def get_soil_moisture_analysis(self, location: str) -> Dict[str, Any]:
         """Analyze soil moisture based on weather patterns"""
@@ -1,40 +1,110 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from langchain_openai import OpenAIEmbeddings
 from typing import Dict, Any, Optional, List
 import asyncio
+import hashlib
 import json
-from datetime import datetime
+import math
+import orjson
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-from crew.agricultural_crew import AgriculturalCrew
+from crew.agricultural_crew import AgriculturalCrew, run_comprehensive_query
+from mcp.mcp_client import MCPDataProvider
+from agents import WeatherAgent, CropAgent, FinanceAgent, close_http_session
 from models.database import create_tables, get_db
 from config import Config
+from utils.embedding_batcher import EmbeddingBatcher
+from utils.semantic_cache import SemanticCache
+from utils.timestamps import now_iso
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database and services on startup, release them on shutdown"""
+    global comprehensive_pool
+    
+    # Size the default thread pool used for offloaded agent work so it can
+    # sustain the LLM request rate at typical latency
+    workers = min(32, max(4, math.ceil(Config.MAX_REQUESTS_PER_MINUTE / 60 * Config.LLM_AVG_LATENCY)))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    
+    if Config.COMPREHENSIVE_QUERY_WORKERS > 0:
+        comprehensive_pool = ProcessPoolExecutor(max_workers=Config.COMPREHENSIVE_QUERY_WORKERS)
+    
+    # Table creation blocks on the database, so keep it off the event loop
+    await asyncio.to_thread(create_tables)
+    
+    # One MCP provider serves every request; it is only closed on shutdown
+    await mcp_provider.initialize()
+    print("KrishiSetu Agricultural AI Advisor started successfully!")
+    
+    try:
+        yield
+    finally:
+        await mcp_provider.close()
+        await close_http_session()
+        if comprehensive_pool is not None:
+            comprehensive_pool.shutdown(cancel_futures=True)
 
 # Create FastAPI app
 app = FastAPI(
     title="KrishiSetu - Agricultural AI Advisor",
     description="AI-powered agricultural advisory system using multi-agent architecture",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Compress larger JSON bodies; responses are verbose and clients are often on mobile networks
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Add CORS middleware; browsers cache preflight responses for a day
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=Config.CORS_ORIGINS,
+    # Credentials only for explicitly listed origins, never for a wildcard
+    allow_credentials="*" not in Config.CORS_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
+    max_age=86400,
 )
 
+# One instance of each agent serves every request; agents keep no per-request
+# state, and their caches and HTTP sessions are safe to share across threads
+weather_agent = WeatherAgent()
+crop_agent = CropAgent()
+finance_agent = FinanceAgent()
+mcp_provider = MCPDataProvider()
+
 # Initialize agricultural crew with error handling
 try:
-    agricultural_crew = AgriculturalCrew()
+    agricultural_crew = AgriculturalCrew(weather_agent, crop_agent, finance_agent, mcp_provider)
     crew_available = True
 except Exception as e:
     print(f"Warning: Agricultural crew initialization failed: {e}")
     agricultural_crew = None
     crew_available = False
 
+# Near-duplicate /query requests reuse earlier answers; needs OpenAI embeddings
+semantic_cache: Optional[SemanticCache] = None
+if Config.OPENAI_API_KEY:
+    semantic_cache = SemanticCache(
+        # Concurrent queries are embedded together in one API call
+        EmbeddingBatcher(
+            OpenAIEmbeddings(model=Config.EMBEDDING_MODEL, api_key=Config.OPENAI_API_KEY).aembed_documents
+        ).embed,
+        threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+        ttl=Config.SEMANTIC_CACHE_TTL
+    )
+
+# Optional worker processes for comprehensive queries, started with the app
+comprehensive_pool: Optional[ProcessPoolExecutor] = None
+
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
     query: str
@@ -63,177 +133,239 @@ class HealthResponse(BaseModel):
     version: str
     crew_status: str
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database and services on startup"""
-    create_tables()
-    print("KrishiSetu Agricultural AI Advisor started successfully!")
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """Turn unexpected errors into a JSON 500; the server still logs the traceback"""
+    return ORJSONResponse({"detail": str(exc)}, status_code=500)
 
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Health check endpoint"""
-    return HealthResponse(
-        status="healthy",
-        timestamp=datetime.now().isoformat(),
-        version="1.0.0",
-        crew_status="available" if crew_available else "unavailable"
+    return {
+        "status": "healthy",
+        "timestamp": now_iso(),
+        "version": "1.0.0",
+        "crew_status": "available" if crew_available else "unavailable"
+    }
+
+async def _answer_query(request: QueryRequest) -> Dict[str, Any]:
+    """Route a query to the full crew or the single most relevant agent"""
+    if request.comprehensive and comprehensive_pool is not None:
+        # Run the full crew in a worker process for true CPU parallelism
+        return await asyncio.get_running_loop().run_in_executor(
+            comprehensive_pool,
+            run_comprehensive_query,
+            request.query,
+            request.context
+        )
+    if request.comprehensive:
+        # Use full crew for comprehensive analysis
+        return await agricultural_crew.process_comprehensive_query(
+            request.query, 
+            request.context
+        )
+    # Use single most relevant agent
+    return await agricultural_crew.process_simple_query(
+        request.query, 
+        request.context
     )
 
+def _answer_ttl(answer: Dict[str, Any]) -> float:
+    """Answers built on live weather data must not outlive the weather cache"""
+    source = answer.get("source", "")
+    if "Weather" in source or "Agricultural Crew" in source:
+        return min(Config.SEMANTIC_CACHE_TTL, Config.WEATHER_CURRENT_TTL)
+    return Config.SEMANTIC_CACHE_TTL
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process agricultural queries using AI agents"""
-    try:
-        if not crew_available:
-            raise HTTPException(status_code=503, detail="Agricultural crew is not available")
-        
-        if request.comprehensive:
-            # Use full crew for comprehensive analysis
-            result = await agricultural_crew.process_comprehensive_query(
-                request.query, 
-                request.context
-            )
-        else:
-            # Use single most relevant agent
-            result = await agricultural_crew.process_simple_query(
-                request.query, 
-                request.context
-            )
-        
-        # Add timestamp
-        result["timestamp"] = datetime.now().isoformat()
-        
-        return QueryResponse(**result)
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not crew_available:
+        raise HTTPException(status_code=503, detail="Agricultural crew is not available")
+    
+    if semantic_cache is not None:
+        # Answers depend on the mode, language and context as well as the wording
+        namespace = (
+            request.comprehensive,
+            request.language,
+            orjson.dumps(request.context, default=str, option=orjson.OPT_SORT_KEYS)
+        )
+        result = await semantic_cache.get_or_compute(
+            namespace,
+            request.query,
+            lambda: _answer_query(request),
+            cacheable=lambda answer: answer.get("success", False),
+            ttl_for=_answer_ttl
+        )
+    else:
+        result = await _answer_query(request)
+    
+    # Add timestamp without touching the (possibly cached) result
+    result = {**result, "timestamp": now_iso()}
+    
+    # Validated and serialized by FastAPI against response_model
+    return result
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """Stream a comprehensive analysis as server-sent events, one event per section"""
+    if not crew_available:
+        raise HTTPException(status_code=503, detail="Agricultural crew is not available")
+    
+    async def events():
+        try:
+            async for section, value in agricultural_crew.astream_comprehensive_query(request.query, request.context):
+                yield f"event: {section}\ndata: {orjson.dumps(value, default=str).decode()}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {orjson.dumps({'detail': str(e)}).decode()}\n\n"
+            return
+        yield f"event: done\ndata: {orjson.dumps({'timestamp': now_iso()}).decode()}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.post("/query/weather")
 async def weather_query(request: QueryRequest):
     """Process weather-specific queries"""
-    try:
-        from agents import WeatherAgent
-        weather_agent = WeatherAgent()
-        result = weather_agent.process_query(request.query, request.context)
-        result["timestamp"] = datetime.now().isoformat()
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await weather_agent.aprocess_query(request.query, request.context)
+    result["timestamp"] = now_iso()
+    return result
 
 @app.post("/query/crop")
 async def crop_query(request: QueryRequest):
     """Process crop-specific queries"""
-    try:
-        from agents import CropAgent
-        crop_agent = CropAgent()
-        result = crop_agent.process_query(request.query, request.context)
-        result["timestamp"] = datetime.now().isoformat()
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await crop_agent.aprocess_query(request.query, request.context)
+    result["timestamp"] = now_iso()
+    return result
 
 @app.post("/query/finance")
 async def finance_query(request: QueryRequest):
     """Process finance-specific queries"""
-    try:
-        from agents import FinanceAgent
-        finance_agent = FinanceAgent()
-        result = finance_agent.process_query(request.query, request.context)
-        result["timestamp"] = datetime.now().isoformat()
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    result = await finance_agent.aprocess_query(request.query, request.context)
+    result["timestamp"] = now_iso()
+    return result
+
+class _StaticJSON:
+    """JSON body serialized once at import and served with HTTP cache validators
+    
+    Clients and any CDN may reuse the body for an hour, then revalidate with
+    If-None-Match and get an empty 304 while the content is unchanged.
+    """
+    
+    CACHE_CONTROL = "public, max-age=3600"
+    
+    def __init__(self, payload: Dict[str, Any]):
+        self.body = orjson.dumps(payload)
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+    
+    def response(self, request: Request) -> Response:
+        headers = {"Cache-Control": self.CACHE_CONTROL, "ETag": self.etag}
+        if_none_match = request.headers.get("if-none-match", "")
+        # If-None-Match uses weak comparison, so W/"x" matches "x" (RFC 9110 13.1.2)
+        tags = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        if if_none_match.strip() == "*" or self.etag in tags:
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+# Static endpoint bodies are serialized once at import rather than per request
+_AGENTS_JSON = _StaticJSON({
+    "agents": [
+        {
+            "name": "Weather Agent",
+            "description": "Provides weather analysis and irrigation recommendations",
+            "capabilities": ["Weather forecasting", "Irrigation advice", "Soil moisture analysis"],
+            "keywords": ["weather", "irrigation", "temperature", "rain", "humidity"]
+        },
+        {
+            "name": "Crop Agent",
+            "description": "Provides crop selection and management advice",
+            "capabilities": ["Crop recommendations", "Market analysis", "Pest management"],
+            "keywords": ["crop", "seed", "harvest", "pest", "fertilizer"]
+        },
+        {
+            "name": "Finance Agent",
+            "description": "Provides financial advice and government scheme information",
+            "capabilities": ["Loan options", "Government schemes", "Market trends"],
+            "keywords": ["loan", "credit", "scheme", "subsidy", "insurance"]
+        }
+    ],
+    "crew_status": "available" if crew_available else "unavailable"
+})
 
 @app.get("/agents")
-async def list_agents():
+async def list_agents(request: Request):
     """List available AI agents"""
-    return {
-        "agents": [
-            {
-                "name": "Weather Agent",
-                "description": "Provides weather analysis and irrigation recommendations",
-                "capabilities": ["Weather forecasting", "Irrigation advice", "Soil moisture analysis"],
-                "keywords": ["weather", "irrigation", "temperature", "rain", "humidity"]
-            },
-            {
-                "name": "Crop Agent",
-                "description": "Provides crop selection and management advice",
-                "capabilities": ["Crop recommendations", "Market analysis", "Pest management"],
-                "keywords": ["crop", "seed", "harvest", "pest", "fertilizer"]
-            },
-            {
-                "name": "Finance Agent",
-                "description": "Provides financial advice and government scheme information",
-                "capabilities": ["Loan options", "Government schemes", "Market trends"],
-                "keywords": ["loan", "credit", "scheme", "subsidy", "insurance"]
-            }
-        ],
-        "crew_status": "available" if crew_available else "unavailable"
-    }
+    return _AGENTS_JSON.response(request)
+
+_SUPPORTED_LANGUAGES_JSON = _StaticJSON({
+    "languages": Config.SUPPORTED_LANGUAGES,
+    "default": "en"
+})
 
 @app.get("/supported-languages")
-async def get_supported_languages():
+async def get_supported_languages(request: Request):
     """Get list of supported languages"""
-    return {
-        "languages": Config.SUPPORTED_LANGUAGES,
-        "default": "en"
-    }
+    return _SUPPORTED_LANGUAGES_JSON.response(request)
+
+_CROPS_JSON = _StaticJSON({
+    "crops": Config.MAJOR_CROPS,
+    "seasons": ["Kharif", "Rabi", "Zaid"]
+})
 
 @app.get("/crops")
-async def get_available_crops():
+async def get_available_crops(request: Request):
     """Get list of major crops supported"""
-    return {
-        "crops": Config.MAJOR_CROPS,
-        "seasons": ["Kharif", "Rabi", "Zaid"]
-    }
+    return _CROPS_JSON.response(request)
+
+_SOIL_TYPES_JSON = _StaticJSON({
+    "soil_types": Config.SOIL_TYPES
+})
 
 @app.get("/soil-types")
-async def get_soil_types():
+async def get_soil_types(request: Request):
     """Get list of soil types in India"""
-    return {
-        "soil_types": Config.SOIL_TYPES
-    }
+    return _SOIL_TYPES_JSON.response(request)
 
 @app.post("/user/profile")
-async def create_user_profile(profile: UserProfile):
+def create_user_profile(profile: UserProfile, db: Session = Depends(get_db)):
     """Create or update user profile"""
-    try:
-        db = next(get_db())
-        # This would typically save to database
-        # For now, return success response
-        return {
-            "success": True,
-            "message": "User profile created successfully",
-            "user_id": "user_123"  # This would be the actual user ID
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # A plain def: FastAPI runs it in the threadpool, so blocking SQLAlchemy
+    # calls on the injected session never stall the event loop
+    # This would typically save to database
+    # For now, return success response
+    return {
+        "success": True,
+        "message": "User profile created successfully",
+        "user_id": "user_123"  # This would be the actual user ID
+    }
+
+_EXAMPLES_JSON = _StaticJSON({
+    "weather_queries": [
+        "When should I irrigate my wheat crop?",
+        "What's the weather forecast for next week?",
+        "Is it going to rain today?",
+        "क्या आज बारिश होगी?",
+        "मेरी गेहूं की फसल को कब सिंचाई करनी चाहिए?"
+    ],
+    "crop_queries": [
+        "Which crop should I plant this season?",
+        "What are the best rice varieties for my area?",
+        "How to control pests in cotton?",
+        "इस मौसम में कौन सी फसल लगानी चाहिए?",
+        "मेरे क्षेत्र के लिए सबसे अच्छे चावल की किस्में कौन सी हैं?"
+    ],
+    "finance_queries": [
+        "What loans are available for farmers?",
+        "Tell me about PM-KISAN scheme",
+        "How to get crop insurance?",
+        "किसानों के लिए कौन से ऋण उपलब्ध हैं?",
+        "PM-KISAN योजना के बारे में बताएं"
+    ]
+})
 
 @app.get("/examples")
-async def get_example_queries():
+async def get_example_queries(request: Request):
     """Get example queries for different categories"""
-    return {
-        "weather_queries": [
-            "When should I irrigate my wheat crop?",
-            "What's the weather forecast for next week?",
-            "Is it going to rain today?",
-            "क्या आज बारिश होगी?",
-            "मेरी गेहूं की फसल को कब सिंचाई करनी चाहिए?"
-        ],
-        "crop_queries": [
-            "Which crop should I plant this season?",
-            "What are the best rice varieties for my area?",
-            "How to control pests in cotton?",
-            "इस मौसम में कौन सी फसल लगानी चाहिए?",
-            "मेरे क्षेत्र के लिए सबसे अच्छे चावल की किस्में कौन सी हैं?"
-        ],
-        "finance_queries": [
-            "What loans are available for farmers?",
-            "Tell me about PM-KISAN scheme",
-            "How to get crop insurance?",
-            "किसानों के लिए कौन से ऋण उपलब्ध हैं?",
-            "PM-KISAN योजना के बारे में बताएं"
-        ]
-    }
+    return _EXAMPLES_JSON.response(request)
 
 if __name__ == "__main__":
     import uvicorn
@@ -241,5 +373,13 @@ if __name__ == "__main__":
         "api.main:app",
         host=Config.HOST,
         port=Config.PORT,
-        reload=Config.DEBUG
+        reload=Config.DEBUG,
+        workers=Config.WORKERS,
+        access_log=Config.ACCESS_LOG,
+        # httptools ships with uvicorn[standard]; the event loop stays on "auto",
+        # which picks uvloop where it is installed
+        http="httptools",
+        proxy_headers=True,
+        # Keep idle client connections open longer than the 5 s default
+        timeout_keep_alive=30
     ) 
\ No newline at end of file
@@ -6,6 +6,34 @@ load_dotenv()
 class Config:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4")
+    # Request JSON-object replies for structured prompts; the model must support it
+    LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "False").lower() == "true"
+    
+    # OpenAI rate limits for the account (requests and tokens per minute)
+    MAX_REQUESTS_PER_MINUTE = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "500"))
+    MAX_TOKENS_PER_MINUTE = int(os.getenv("MAX_TOKENS_PER_MINUTE", "40000"))
+    
+    # Typical LLM round-trip in seconds, used to size the worker thread pool
+    LLM_AVG_LATENCY = float(os.getenv("LLM_AVG_LATENCY", "5"))
+    
+    # Upper bound on a single LLM request, in seconds, before it is retried
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+    
+    # Worker processes for comprehensive /query requests (0 runs them in the API process)
+    COMPREHENSIVE_QUERY_WORKERS = int(os.getenv("COMPREHENSIVE_QUERY_WORKERS", "0"))
+    
+    # Default cap on in-flight external calls per agent
+    AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "20"))
+    
+    # Semantic cache for /query: near-duplicate queries above the cosine
+    # similarity threshold reuse the earlier response for ttl seconds
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+    
+    # How long per-agent insights for comprehensive queries are reused, in seconds
+    AGENT_INSIGHT_TTL = int(os.getenv("AGENT_INSIGHT_TTL", "600"))
     
     # Tavily API for web search
     TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
@@ -13,6 +41,10 @@ class Config:
     # Weather API
     WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
     
+    # How long OpenWeather responses are cached, in seconds
+    WEATHER_CURRENT_TTL = int(os.getenv("WEATHER_CURRENT_TTL", "600"))
+    WEATHER_FORECAST_TTL = int(os.getenv("WEATHER_FORECAST_TTL", "3600"))
+    
     # Database Configuration
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./krishisetu.db")
     
@@ -20,9 +52,25 @@ class Config:
     DEBUG = os.getenv("DEBUG", "True").lower() == "true"
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", "8000"))
+    # Comma-separated browser origins allowed to call the API; none by default.
+    # "*" allows any origin, but then without credentials (cookies/auth headers)
+    CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "").split(",") if origin.strip()]
+    # Uvicorn worker processes; caches, pools and the LLM rate budget are per
+    # worker, so the budget is split between them. Reload (DEBUG) needs one.
+    WORKERS = 1 if DEBUG else max(1, int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1"))))
+    # Per-request access log lines; off by default outside DEBUG
+    ACCESS_LOG = os.getenv("ACCESS_LOG", str(DEBUG)).lower() == "true"
     
     # MCP Configuration
     MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:3000")
+    # Fetch comprehensive data with one POST /data/bulk call (server must support it)
+    MCP_BULK_DATA = os.getenv("MCP_BULK_DATA", "False").lower() == "true"
+    
+    # How long MCP responses are cached, in seconds (soil and policy change slowly)
+    MCP_WEATHER_TTL = int(os.getenv("MCP_WEATHER_TTL", "300"))
+    MCP_MARKET_TTL = int(os.getenv("MCP_MARKET_TTL", "1800"))
+    MCP_SOIL_TTL = int(os.getenv("MCP_SOIL_TTL", "21600"))
+    MCP_POLICY_TTL = int(os.getenv("MCP_POLICY_TTL", "21600"))
     
     # Agricultural Data Sources
     WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5"
@@ -1,84 +1,98 @@
 from crewai import Crew, Task
-from typing import Dict, Any, List
-from agents import WeatherAgent, CropAgent, FinanceAgent
+from typing import Dict, Any, AsyncIterator, List, Tuple
+from agents import WeatherAgent, CropAgent, FinanceAgent, close_http_session
+from agents.base_agent import dumps
 from mcp.mcp_client import MCPDataProvider
+from config import Config
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
 import asyncio
+import orjson
+import string
+import time
+
+# (agent attribute, task description, expected output) for each crew task
+_TASK_TEMPLATES = (
+    ("weather_agent",
+     "Analyze weather conditions and provide irrigation advice for: {query}",
+     "Weather analysis and irrigation recommendations"),
+    ("crop_agent",
+     "Provide crop selection and management advice for: {query}",
+     "Crop recommendations and management strategies"),
+    ("finance_agent",
+     "Provide financial advice and government scheme information for: {query}",
+     "Financial options and government support information")
+)
+
+# Returned by process_simple_query when no agent's keywords match the query
+_ROUTER_FALLBACK_MESSAGE = (
+    "Please ask about weather and irrigation, crops and farming practices, "
+    "or loans, schemes and market prices."
+)
+
+# (MCP source, field, condition, recommendation category, message) checked by
+# _synthesize_recommendations against the comprehensive MCP data
+_RECOMMENDATION_RULES = (
+    ("weather", "temperature", lambda temperature: temperature > 30,
+     "immediate_actions", "Increase irrigation frequency due to high temperature"),
+    ("weather", "humidity", lambda humidity: humidity < 50,
+     "immediate_actions", "Monitor soil moisture levels"),
+    ("market", "trend", lambda trend: trend == "Rising",
+     "opportunities", "Consider planting crops with rising market prices")
+)
+
+# Agent insights shared by every crew in the process, keyed by (agent, query, context)
+_insight_cache = TTLCache(maxsize=4096, ttl=Config.AGENT_INSIGHT_TTL)
+_insight_inflight = SingleFlight()
+
+# ASCII punctuation and the Devanagari danda; \W would also strip Hindi vowel signs
+_STRIP_PUNCTUATION = str.maketrans(dict.fromkeys(string.punctuation + "।॥", " "))
+
+def _insight_key(agent_type: str, query: str, context: Dict[str, Any]) -> tuple:
+    """Cache key that ignores case, punctuation and spacing differences in the query"""
+    normalized = " ".join(query.lower().translate(_STRIP_PUNCTUATION).split())
+    return agent_type, normalized, orjson.dumps(context, default=str, option=orjson.OPT_SORT_KEYS)
 
 class AgriculturalCrew:
     """Crew that orchestrates multiple agricultural agents"""
     
-    def __init__(self):
-        self.weather_agent = WeatherAgent()
-        self.crop_agent = CropAgent()
-        self.finance_agent = FinanceAgent()
-        self.mcp_provider = MCPDataProvider()
+    def __init__(self, weather_agent: WeatherAgent = None, crop_agent: CropAgent = None,
+                 finance_agent: FinanceAgent = None, mcp_provider: MCPDataProvider = None):
+        # Agents and the MCP provider may be passed in so the crew shares the
+        # caller's instances and their lifecycle
+        self.weather_agent = weather_agent or WeatherAgent()
+        self.crop_agent = crop_agent or CropAgent()
+        self.finance_agent = finance_agent or FinanceAgent()
+        self.mcp_provider = mcp_provider or MCPDataProvider()
+        self._agents = {
+            'weather': self.weather_agent,
+            'crop': self.crop_agent,
+            'finance': self.finance_agent
+        }
+        
+        # Lower-cased routing keywords per agent, computed once for every query
+        self._agent_keywords = {
+            'weather': tuple(keyword.lower() for keyword in self.weather_agent._get_keywords()),
+            'crop': tuple(keyword.lower() for keyword in self.crop_agent._get_keywords()),
+            'finance': tuple(keyword.lower() for keyword in self.finance_agent._get_keywords())
+        }
         
     async def process_comprehensive_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Process a comprehensive agricultural query using multiple agents"""
         
         try:
-            # Initialize MCP data provider
-            await self.mcp_provider.initialize()
-            
-            # Check if LLM is available
-            if self.weather_agent.llm is None:
-                # Fallback to direct agent processing without CrewAI
-                return await self._process_without_crew(query, context)
-            
-            # Create tasks for different aspects
-            weather_task = Task(
-                description=f"Analyze weather conditions and provide irrigation advice for: {query}",
-                agent=self.weather_agent.agent,
-                expected_output="Weather analysis and irrigation recommendations"
-            )
-            
-            crop_task = Task(
-                description=f"Provide crop selection and management advice for: {query}",
-                agent=self.crop_agent.agent,
-                expected_output="Crop recommendations and management strategies"
-            )
-            
-            finance_task = Task(
-                description=f"Provide financial advice and government scheme information for: {query}",
-                agent=self.finance_agent.agent,
-                expected_output="Financial options and government support information"
-            )
-            
-            # Create the crew
-            crew = Crew(
-                agents=[self.weather_agent.agent, self.crop_agent.agent, self.finance_agent.agent],
-                tasks=[weather_task, crop_task, finance_task],
-                verbose=True
-            )
-            
-            # Execute the crew
-            result = crew.kickoff()
-            
-            # Get additional data from MCP
-            location = context.get('location', 'Mumbai') if context else 'Mumbai'
-            crop = context.get('crop_type', 'general') if context else 'general'
-            state = context.get('state', 'Maharashtra') if context else 'Maharashtra'
-            
-            mcp_data = await self.mcp_provider.get_comprehensive_data(location, crop, state)
-            
-            # Combine results
             comprehensive_response = {
-                "crew_result": result,
-                "mcp_data": mcp_data,
-                "agent_insights": {
-                    "weather": await self._get_agent_insight(self.weather_agent, query, context),
-                    "crop": await self._get_agent_insight(self.crop_agent, query, context),
-                    "finance": await self._get_agent_insight(self.finance_agent, query, context)
-                },
-                "recommendations": self._synthesize_recommendations(result, mcp_data),
-                "timestamp": asyncio.get_event_loop().time()
+                section: value async for section, value in self.astream_comprehensive_query(query, context)
             }
+            confidence = comprehensive_response.pop("confidence")
+            comprehensive_response["timestamp"] = time.monotonic()
             
             return {
                 "success": True,
                 "data": comprehensive_response,
-                "confidence": self._calculate_overall_confidence(comprehensive_response),
-                "source": "Agricultural Crew"
+                "confidence": confidence,
+                "source": "Agricultural Crew" if self.weather_agent.llm is not None
+                          else "Agricultural Crew (Direct Processing)"
             }
             
         except Exception as e:
@@ -88,58 +102,108 @@ class AgriculturalCrew:
                 "confidence": 0.0,
                 "source": "Agricultural Crew"
             }
-        finally:
-            await self.mcp_provider.close()
     
-    async def _process_without_crew(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Process query without CrewAI when LLM is not available"""
+    async def astream_comprehensive_query(self, query: str,
+                                          context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield (section, value) pairs of a comprehensive response as each is ready
+        
+        The crew run, MCP data and agent insights are produced concurrently and
+        yielded in completion order, followed by the recommendations and overall
+        confidence derived from them. Without an LLM the crew step is skipped.
+        """
+        location = context.get('location', 'Mumbai') if context else 'Mumbai'
+        crop = context.get('crop_type', 'general') if context else 'general'
+        state = context.get('state', 'Maharashtra') if context else 'Maharashtra'
+        
+        response = {}
+        pending = {
+            "mcp_data": self.mcp_provider.get_comprehensive_data(location, crop, state),
+            "agent_insights": self._get_agent_insights(query, context)
+        }
+        if self.weather_agent.llm is not None:
+            # kickoff_async runs the crew in a worker thread, so the MCP fetch
+            # and agent insights overlap with the LLM round trips
+            pending["crew_result"] = self._kickoff_crew(query)
+        else:
+            response["crew_result"] = "Direct agent processing (no LLM available)"
+            yield "crew_result", response["crew_result"]
+        
+        async def labelled(section, awaitable):
+            return section, await awaitable
+        
+        tasks = [asyncio.ensure_future(labelled(section, awaitable)) for section, awaitable in pending.items()]
         try:
-            # Get insights from individual agents
-            weather_insight = self.weather_agent.process_query(query, context)
-            crop_insight = self.crop_agent.process_query(query, context)
-            finance_insight = self.finance_agent.process_query(query, context)
-            
-            # Get MCP data
-            location = context.get('location', 'Mumbai') if context else 'Mumbai'
-            crop = context.get('crop_type', 'general') if context else 'general'
-            state = context.get('state', 'Maharashtra') if context else 'Maharashtra'
-            
-            mcp_data = await self.mcp_provider.get_comprehensive_data(location, crop, state)
-            
-            # Synthesize response
-            comprehensive_response = {
-                "crew_result": "Direct agent processing (no LLM available)",
-                "mcp_data": mcp_data,
-                "agent_insights": {
-                    "weather": weather_insight,
-                    "crop": crop_insight,
-                    "finance": finance_insight
-                },
-                "recommendations": self._synthesize_recommendations("Direct processing", mcp_data),
-                "timestamp": asyncio.get_event_loop().time()
-            }
-            
-            return {
-                "success": True,
-                "data": comprehensive_response,
-                "confidence": self._calculate_overall_confidence(comprehensive_response),
-                "source": "Agricultural Crew (Direct Processing)"
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "confidence": 0.0,
-                "source": "Agricultural Crew"
-            }
+            for next_done in asyncio.as_completed(tasks):
+                section, value = await next_done
+                response[section] = value
+                yield section, value
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        response["recommendations"] = self._synthesize_recommendations(response["crew_result"], response["mcp_data"])
+        yield "recommendations", response["recommendations"]
+        yield "confidence", self._calculate_overall_confidence(response)
     
-    async def _get_agent_insight(self, agent, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Get specific insights from individual agents"""
-        try:
-            return agent.process_query(query, context)
-        except Exception as e:
-            return {"error": str(e)}
+    def _build_crew(self, query: str) -> Crew:
+        """Create the weather, crop and finance tasks for a query
+        
+        A fresh Crew is built per query because kickoff records task outputs
+        on the Task objects, so one shared Crew is not safe across concurrent
+        queries. Verbose logging is off to keep kickoff free of console I/O.
+        """
+        agents = [getattr(self, attr).agent for attr, _, _ in _TASK_TEMPLATES]
+        tasks = [
+            Task(description=description.format(query=query), agent=agent, expected_output=expected_output)
+            for agent, (_, description, expected_output) in zip(agents, _TASK_TEMPLATES)
+        ]
+        return Crew(agents=agents, tasks=tasks, verbose=False)
+    
+    async def _kickoff_crew(self, query: str) -> Any:
+        """Run the crew for a query within the LLM rate limits
+        
+        Each task is one LLM call by an agent with its backstory as the system
+        prompt, so capacity for all of them is reserved before the kickoff.
+        """
+        crew = self._build_crew(query)
+        prompt = "\n".join(task.description + "\n" + task.agent.backstory for task in crew.tasks)
+        async with self.weather_agent.reserve_llm(prompt, calls=len(crew.tasks)):
+            return await crew.kickoff_async()
+    
+    async def _get_agent_insight(self, agent_type: str, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Get specific insights from individual agents
+        
+        Successful insights are cached serialized, and concurrent identical
+        requests share one agent call.
+        """
+        key = _insight_key(agent_type, query, context)
+        
+        async def fetch_frozen() -> bytes:
+            insight = await self._agents[agent_type].aprocess_query(query, context)
+            frozen = dumps(insight)
+            if insight.get("success", False):
+                _insight_cache.set(key, frozen)
+            return frozen
+        
+        frozen = _insight_cache.get(key)
+        if frozen is None:
+            try:
+                frozen = await _insight_inflight.do(key, fetch_frozen)
+            except Exception as e:
+                return {"error": str(e)}
+        # Each caller decodes its own copy of the shared insight
+        return orjson.loads(frozen)
+    
+    async def _get_agent_insights(self, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Get insights from all three agents concurrently
+        
+        Each agent's own concurrency gate bounds its in-flight external calls,
+        so the wall time is the slowest agent rather than the sum.
+        """
+        insights = await asyncio.gather(*(
+            self._get_agent_insight(agent_type, query, context) for agent_type in self._agents
+        ))
+        return dict(zip(self._agents, insights))
     
     def _synthesize_recommendations(self, crew_result: str, mcp_data: Dict[str, Any]) -> Dict[str, Any]:
         """Synthesize recommendations from crew results and MCP data"""
@@ -151,68 +215,106 @@ class AgriculturalCrew:
             "opportunities": []
         }
         
-        # Extract immediate actions from weather data
-        if 'weather' in mcp_data and 'error' not in mcp_data['weather']:
-            weather = mcp_data['weather']
-            if weather.get('temperature', 25) > 30:
-                recommendations["immediate_actions"].append("Increase irrigation frequency due to high temperature")
-            if weather.get('humidity', 60) < 50:
-                recommendations["immediate_actions"].append("Monitor soil moisture levels")
-        
-        # Extract crop recommendations
-        if 'market' in mcp_data and 'error' not in mcp_data['market']:
-            market = mcp_data['market']
-            if market.get('trend') == 'Rising':
-                recommendations["opportunities"].append("Consider planting crops with rising market prices")
+        # Skip sources that failed to load and fields they did not report
+        for source, field, condition, category, message in _RECOMMENDATION_RULES:
+            data = mcp_data.get(source)
+            if not isinstance(data, dict) or 'error' in data:
+                continue
+            value = data.get(field)
+            if value is not None and condition(value):
+                recommendations[category].append(message)
         
         # Extract policy opportunities
-        if 'policies' in mcp_data and mcp_data['policies']:
+        # Errors arrive as a dict, or as a list holding one error entry
+        policies = mcp_data.get('policies')
+        if isinstance(policies, list) and policies and not (isinstance(policies[0], dict) and 'error' in policies[0]):
             recommendations["opportunities"].append("Explore available government schemes and subsidies")
         
         return recommendations
     
     def _calculate_overall_confidence(self, response: Dict[str, Any]) -> float:
         """Calculate overall confidence score"""
-        confidence_scores = []
+        # Get confidence from individual agents, skipping failed lookups
+        confidence_scores = [
+            insight['confidence'] for insight in response.get('agent_insights', {}).values()
+            if isinstance(insight, dict) and insight.get('confidence') is not None
+        ]
         
-        # Get confidence from individual agents
-        for agent_type, insight in response.get('agent_insights', {}).items():
-            if 'confidence' in insight:
-                confidence_scores.append(insight['confidence'])
-        
-        # Get confidence from MCP data quality
-        mcp_data = response.get('mcp_data', {})
-        mcp_errors = sum(1 for data in mcp_data.values() if 'error' in data)
-        mcp_confidence = max(0, 1 - (mcp_errors / len(mcp_data))) if mcp_data else 0.5
-        confidence_scores.append(mcp_confidence)
+        # Get confidence from MCP data quality, counting sources and errors in one pass
+        total = errors = 0
+        for data in response.get('mcp_data', {}).values():
+            total += 1
+            if isinstance(data, dict) and 'error' in data:
+                errors += 1
+        confidence_scores.append(1 - errors / total if total else 0.5)
         
         # Calculate average confidence
-        return sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.5
+        return sum(confidence_scores) / len(confidence_scores)
     
     async def process_simple_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Process a simple query using the most relevant agent"""
         
         # Determine the most relevant agent based on keywords
+        query_lower = query.lower()
         agent_scores = {
-            'weather': self._calculate_relevance_score(query, self.weather_agent._get_keywords()),
-            'crop': self._calculate_relevance_score(query, self.crop_agent._get_keywords()),
-            'finance': self._calculate_relevance_score(query, self.finance_agent._get_keywords())
+            agent_type: self._calculate_relevance_score(query_lower, keywords)
+            for agent_type, keywords in self._agent_keywords.items()
         }
         
-        # Select the most relevant agent
-        best_agent_type = max(agent_scores, key=agent_scores.get)
+        best_score = max(agent_scores.values())
+        if best_score == 0:
+            # Nothing to route on; answer cheaply instead of spending an agent call
+            return {
+                "success": True,
+                "data": {
+                    "message": _ROUTER_FALLBACK_MESSAGE,
+                    "topics": list(self._agent_keywords)
+                },
+                "confidence": 0.0,
+                "source": "Router"
+            }
+        
+        best_agent_types = [agent_type for agent_type, score in agent_scores.items() if score == best_score]
+        if len(best_agent_types) == 1:
+            return await self._agents[best_agent_types[0]].aprocess_query(query, context)
         
-        if best_agent_type == 'weather':
-            agent = self.weather_agent
-        elif best_agent_type == 'crop':
-            agent = self.crop_agent
-        else:
-            agent = self.finance_agent
+        # Equally relevant agents answer in parallel rather than whichever comes first
+        results = await asyncio.gather(*(
+            self._agents[agent_type].aprocess_query(query, context) for agent_type in best_agent_types
+        ))
+        return {
+            "success": any(result.get("success", False) for result in results),
+            "data": {agent_type: result for agent_type, result in zip(best_agent_types, results)},
+            "confidence": max(result.get("confidence", 0.0) for result in results),
+            "source": " + ".join(result.get("source", agent_type) for agent_type, result in zip(best_agent_types, results))
+        }
+    
+    def _calculate_relevance_score(self, query_lower: str, keywords: Tuple[str, ...]) -> float:
+        """Calculate relevance score based on keyword matching
         
-        return agent.process_query(query, context)
+        Both the query and keywords are already lower-cased. Substring matching
+        is kept deliberately so plurals such as "loans" still match "loan".
+        """
+        matches = sum(1 for keyword in keywords if keyword in query_lower)
+        return matches / len(keywords) if keywords else 0.0
+
+# Crew for the current worker process, created on first use by run_comprehensive_query
+_process_crew = None
+
+def run_comprehensive_query(query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Run a comprehensive query to completion in a worker process
     
-    def _calculate_relevance_score(self, query: str, keywords: List[str]) -> float:
-        """Calculate relevance score based on keyword matching"""
-        query_lower = query.lower()
-        matches = sum(1 for keyword in keywords if keyword.lower() in query_lower)
-        return matches / len(keywords) if keywords else 0.0 
\ No newline at end of file
+    Entry point for a ProcessPoolExecutor: each worker builds its own crew once,
+    so CPU-bound orchestration runs outside the API process's GIL.
+    """
+    global _process_crew
+    if _process_crew is None:
+        _process_crew = AgriculturalCrew()
+    return asyncio.run(_run_comprehensive_query(_process_crew, query, context))
+
+async def _run_comprehensive_query(crew: AgriculturalCrew, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    # Each asyncio.run gets a new loop, so close the pooled HTTP session it opened
+    try:
+        return await crew.process_comprehensive_query(query, context)
+    finally:
+        await close_http_session()
\ No newline at end of file
@@ -85,20 +85,23 @@ class KrishiSetuDemo:
             }
         ]
         
-        for i, demo in enumerate(demo_queries, 1):
+        # Run the demos concurrently, at most four at a time to respect rate limits
+        semaphore = asyncio.Semaphore(4)
+        
+        async def process_limited(demo):
+            async with semaphore:
+                return await self.process_demo_query(demo)
+        
+        results = await asyncio.gather(*(process_limited(demo) for demo in demo_queries))
+        
+        for i, (demo, result) in enumerate(zip(demo_queries, results), 1):
             print(f"\n🔍 Demo {i}: {demo['category']} Query ({demo['language']})")
             print("-" * 50)
             print(f"Query: {demo['query']}")
             print(f"Context: {demo['context']}")
             
-            # Process the query
-            result = await self.process_demo_query(demo)
-            
             # Display results
             self.display_results(result)
-            
-            # Wait between queries
-            await asyncio.sleep(2)
     
     async def process_demo_query(self, demo):
         """Process a demo query"""
@@ -210,7 +213,8 @@ async def main():
     print("1. Simple Demo (quick overview)")
     print("2. Comprehensive Demo (full features)")
     
-    choice = input("Enter choice (1 or 2): ").strip()
+    # Read the choice off the event loop thread so input() does not block it
+    choice = (await asyncio.to_thread(input, "Enter choice (1 or 2): ")).strip()
     
     if choice == "1":
         await demo.run_simple_demo()
@@ -35,6 +35,14 @@ def main():
         host=Config.HOST,
         port=Config.PORT,
         reload=Config.DEBUG,
+        workers=Config.WORKERS,
+        access_log=Config.ACCESS_LOG,
+        # httptools ships with uvicorn[standard]; the event loop stays on "auto",
+        # which picks uvloop where it is installed
+        http="httptools",
+        proxy_headers=True,
+        # Keep idle client connections open longer than the 5 s default
+        timeout_keep_alive=30,
         log_level="info"
     )
 
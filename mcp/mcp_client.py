@@ -1,45 +1,107 @@
-import json
 import asyncio
 import aiohttp
+import orjson
+from functools import wraps
 from typing import Dict, Any, List, Optional
 from config import Config
+from agents.base_agent import get_http_session
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
+
+# Bound each MCP call so a slow server cannot stall comprehensive queries
+_MCP_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
+# MCP data shared by every client in the process, keyed by (kind, server, key)
+_data_cache = TTLCache(maxsize=1024)
+_inflight = SingleFlight()
+
+# How long each kind of MCP data stays cached
+_CACHE_TTLS = {
+    "weather": Config.MCP_WEATHER_TTL,
+    "market": Config.MCP_MARKET_TTL,
+    "soil": Config.MCP_SOIL_TTL,
+    "policy": Config.MCP_POLICY_TTL
+}
+
+def _is_error(data: Any) -> bool:
+    if isinstance(data, list):
+        return bool(data) and isinstance(data[0], dict) and "error" in data[0]
+    return not isinstance(data, dict) or "error" in data
+
+def _cached(kind: str):
+    """Serve an MCP getter from the shared TTL cache
+    
+    Concurrent misses for the same key share one request, and error
+    payloads are returned without being cached. Data is held serialized and
+    each caller decodes its own copy, so callers cannot alter each other's.
+    """
+    def decorator(fetch):
+        @wraps(fetch)
+        async def wrapper(self, key: str):
+            cache_key = (kind, self.server_url, key)
+            
+            async def fetch_frozen() -> bytes:
+                data = await fetch(self, key)
+                frozen = orjson.dumps(data)
+                if not _is_error(data):
+                    _data_cache.set(cache_key, frozen, _CACHE_TTLS[kind])
+                return frozen
+            
+            frozen = _data_cache.get(cache_key)
+            if frozen is None:
+                frozen = await _inflight.do(cache_key, fetch_frozen)
+            return orjson.loads(frozen)
+        return wrapper
+    return decorator
 
 class MCPClient:
     """Model Context Protocol client for external data integration"""
     
     def __init__(self, server_url: str = None):
         self.server_url = server_url or Config.MCP_SERVER_URL
-        self.session = None
+    
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Process-wide pooled session, so MCP calls reuse keep-alive connections"""
+        return get_http_session()
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # The shared session outlives the client; it is closed on app shutdown
+        pass
+    
+    async def _request(self, method: str, path: str, params: Dict[str, str] = None,
+                       json: Dict[str, Any] = None) -> Any:
+        """Send a request to the MCP server and decode its JSON body
+        
+        HTTP error statuses raise, so callers report them as error payloads
+        (which are never cached) instead of passing the server's body along.
+        """
+        async with self.session.request(method, f"{self.server_url}{path}", params=params,
+                                        json=json, timeout=_MCP_TIMEOUT) as response:
+            response.raise_for_status()
+            return orjson.loads(await response.read())
     
     async def initialize(self) -> Dict[str, Any]:
         """Initialize MCP connection"""
         try:
-            async with self.session.post(f"{self.server_url}/initialize") as response:
-                return await response.json()
+            return await self._request("POST", "/initialize")
         except Exception as e:
             return {"error": f"Failed to initialize MCP: {str(e)}"}
     
     async def list_resources(self) -> List[Dict[str, Any]]:
         """List available resources"""
         try:
-            async with self.session.get(f"{self.server_url}/resources") as response:
-                return await response.json()
+            return await self._request("GET", "/resources")
         except Exception as e:
             return [{"error": f"Failed to list resources: {str(e)}"}]
     
     async def read_resource(self, resource_id: str) -> Dict[str, Any]:
         """Read a specific resource"""
         try:
-            async with self.session.get(f"{self.server_url}/resources/{resource_id}") as response:
-                return await response.json()
+            return await self._request("GET", f"/resources/{resource_id}")
         except Exception as e:
             return {"error": f"Failed to read resource: {str(e)}"}
     
@@ -47,55 +109,114 @@ class MCPClient:
         """Search for resources"""
         try:
             params = {"query": query}
-            async with self.session.get(f"{self.server_url}/search", params=params) as response:
-                return await response.json()
+            return await self._request("GET", "/search", params)
         except Exception as e:
             return [{"error": f"Failed to search resources: {str(e)}"}]
     
+    @_cached("weather")
     async def get_weather_data(self, location: str) -> Dict[str, Any]:
         """Get weather data through MCP"""
         try:
             params = {"location": location, "type": "weather"}
-            async with self.session.get(f"{self.server_url}/data", params=params) as response:
-                return await response.json()
+            return await self._request("GET", "/data", params)
         except Exception as e:
             return {"error": f"Failed to get weather data: {str(e)}"}
     
+    @_cached("market")
     async def get_market_data(self, crop: str) -> Dict[str, Any]:
         """Get market data through MCP"""
         try:
             params = {"crop": crop, "type": "market"}
-            async with self.session.get(f"{self.server_url}/data", params=params) as response:
-                return await response.json()
+            return await self._request("GET", "/data", params)
         except Exception as e:
             return {"error": f"Failed to get market data: {str(e)}"}
     
+    @_cached("soil")
     async def get_soil_data(self, location: str) -> Dict[str, Any]:
         """Get soil data through MCP"""
         try:
             params = {"location": location, "type": "soil"}
-            async with self.session.get(f"{self.server_url}/data", params=params) as response:
-                return await response.json()
+            return await self._request("GET", "/data", params)
         except Exception as e:
             return {"error": f"Failed to get soil data: {str(e)}"}
     
+    @_cached("policy")
     async def get_policy_data(self, state: str) -> List[Dict[str, Any]]:
         """Get government policy data through MCP"""
         try:
             params = {"state": state, "type": "policy"}
-            async with self.session.get(f"{self.server_url}/data", params=params) as response:
-                return await response.json()
+            return await self._request("GET", "/data", params)
         except Exception as e:
             return [{"error": f"Failed to get policy data: {str(e)}"}]
 
+    async def get_bulk_data(self, location: str, crop: str = None, state: str = None) -> Dict[str, Any]:
+        """Get weather, soil, market and policy data in one round trip
+        
+        Kinds already cached are served locally and the rest are requested
+        together from /data/bulk, whose reply maps each kind to its payload.
+        Kinds the bulk call does not return fall back to their own getters.
+        """
+        wanted = {
+            'weather': ("weather", location, self.get_weather_data),
+            'soil': ("soil", location, self.get_soil_data)
+        }
+        if crop:
+            wanted['market'] = ("market", crop, self.get_market_data)
+        if state:
+            wanted['policies'] = ("policy", state, self.get_policy_data)
+        
+        data = {}
+        for name, (kind, key, _) in wanted.items():
+            cached = _data_cache.get((kind, self.server_url, key))
+            if cached is not None:
+                data[name] = orjson.loads(cached)
+        missing = [name for name in wanted if name not in data]
+        if not missing:
+            return data
+        
+        try:
+            payload = {
+                "location": location,
+                "crop": crop,
+                "state": state,
+                "kinds": [wanted[name][0] for name in missing]
+            }
+            bulk = await self._request("POST", "/data/bulk", json=payload)
+        except Exception as e:
+            print(f"MCP bulk data request failed, fetching individually: {e}")
+            bulk = None
+        if not isinstance(bulk, dict):
+            bulk = {}
+        
+        fallback = {}
+        for name in missing:
+            kind, key, getter = wanted[name]
+            value = bulk.get(kind)
+            if value is None or _is_error(value):
+                fallback[name] = getter(key)
+            else:
+                _data_cache.set((kind, self.server_url, key), orjson.dumps(value), _CACHE_TTLS[kind])
+                data[name] = value
+        if fallback:
+            data.update(zip(fallback, await asyncio.gather(*fallback.values())))
+        
+        return {name: data[name] for name in wanted}
+
 class MCPDataProvider:
-    """Data provider that uses MCP for external data sources"""
+    """Data provider that uses MCP for external data sources
+    
+    One provider is meant to be shared for the life of the application:
+    initialize it on startup (or let the first query do so) and close it
+    on shutdown, never per query.
+    """
     
     def __init__(self):
         self.mcp_client = None
     
     async def initialize(self):
-        """Initialize MCP client"""
+        """Initialize MCP client once; later calls reuse it"""
+        if self.mcp_client is not None:
+            return
         self.mcp_client = MCPClient()
         await self.mcp_client.__aenter__()
         await self.mcp_client.initialize()
@@ -104,30 +225,36 @@ class MCPDataProvider:
         """Close MCP client"""
         if self.mcp_client:
             await self.mcp_client.__aexit__(None, None, None)
+            self.mcp_client = None
+    
+    async def __aenter__(self):
+        await self.initialize()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
     
     async def get_comprehensive_data(self, location: str, crop: str = None, state: str = None) -> Dict[str, Any]:
         """Get comprehensive data from multiple sources"""
         if not self.mcp_client:
             await self.initialize()
         
-        data = {}
-        
-        # Get weather data
-        weather_data = await self.mcp_client.get_weather_data(location)
-        data['weather'] = weather_data
+        if Config.MCP_BULK_DATA:
+            return await self.mcp_client.get_bulk_data(location, crop, state)
         
-        # Get soil data
-        soil_data = await self.mcp_client.get_soil_data(location)
-        data['soil'] = soil_data
+        # Weather and soil data are always fetched
+        sources = {
+            'weather': self.mcp_client.get_weather_data(location),
+            'soil': self.mcp_client.get_soil_data(location)
+        }
         
-        # Get market data if crop is specified
+        # Market data if crop is specified, policy data if state is specified
         if crop:
-            market_data = await self.mcp_client.get_market_data(crop)
-            data['market'] = market_data
-        
-        # Get policy data if state is specified
+            sources['market'] = self.mcp_client.get_market_data(crop)
         if state:
-            policy_data = await self.mcp_client.get_policy_data(state)
-            data['policies'] = policy_data
+            sources['policies'] = self.mcp_client.get_policy_data(state)
         
-        return data 
\ No newline at end of file
+        # Each source is an independent round trip and reports its own errors,
+        # so fetch them concurrently
+        results = await asyncio.gather(*sources.values())
+        return dict(zip(sources, results)) 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean
+from sqlalchemy import create_engine, event, Column, Index, Integer, String, Text, DateTime, Float, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -25,6 +25,9 @@ class Query(Base):
     response = Column(Text)
     confidence_score = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # A user's recent queries, optionally of one type
+    __table_args__ = (Index("ix_queries_user_type_ts", "user_id", "query_type", "created_at"),)
 
 class WeatherData(Base):
     __tablename__ = "weather_data"
@@ -36,6 +39,9 @@ class WeatherData(Base):
     rainfall = Column(Float)
     wind_speed = Column(Float)
     recorded_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Latest readings for a location
+    __table_args__ = (Index("ix_weather_loc_ts", "location", "recorded_at"),)
 
 class CropData(Base):
     __tablename__ = "crop_data"
@@ -48,6 +54,8 @@ class CropData(Base):
     growth_duration = Column(Integer)  # in days
     yield_per_hectare = Column(Float)
     market_price = Column(Float)
+    
+    __table_args__ = (Index("ix_crop_name_season", "crop_name", "season"),)
 
 class PolicyData(Base):
     __tablename__ = "policy_data"
@@ -60,9 +68,33 @@ class PolicyData(Base):
     application_process = Column(Text)
     contact_info = Column(Text)
     is_active = Column(Boolean, default=True)
+    
+    __table_args__ = (Index("ix_policy_active_name", "is_active", "policy_name"),)
+
+# SQLite connection settings: WAL lets readers run alongside a writer, and
+# synchronous=NORMAL skips the per-commit fsync that WAL makes unnecessary
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456"
+)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
 
 # Database setup
-engine = create_engine(Config.DATABASE_URL)
+if Config.DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(Config.DATABASE_URL)
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+else:
+    # Keep warm pooled connections for server databases; pre-ping drops stale
+    # ones and recycling avoids server-side idle timeouts
+    engine = create_engine(Config.DATABASE_URL, pool_size=20, max_overflow=40,
+                           pool_pre_ping=True, pool_recycle=1800)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
@@ -5,7 +5,7 @@ A simple demo to test the agricultural AI advisor system without requiring API k
 """
 
 import asyncio
-import json
+import orjson
 from datetime import datetime
 
 def run_offline_demo():
@@ -101,7 +101,7 @@ def run_offline_demo():
         "timestamp": datetime.now().isoformat()
     }
     
-    print(json.dumps(sample_response, indent=2))
+    print(orjson.dumps(sample_response, option=orjson.OPT_INDENT_2).decode())
     print()
     
     # Show setup instructions
@@ -1,14 +1,29 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi.testclient import TestClient
 import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
 from agents import WeatherAgent, CropAgent, FinanceAgent
+from agents.chain import crop_then_finance
+from agents.finance_agent import _insurance_options
+from agents.rate_limiter import AsyncLeakyBucket
+from agents.weather_agent import _GroupBatcher, _aget_json
+from crew.agricultural_crew import AgriculturalCrew
+from mcp.mcp_client import MCPClient, MCPDataProvider, _data_cache
 from utils.language_processor import LanguageProcessor
+from utils.semantic_cache import SemanticCache
+from utils.single_flight import SingleFlight
+from utils.ttl_cache import TTLCache
 
 class TestWeatherAgent(unittest.TestCase):
     """Test cases for WeatherAgent"""
     
-    def setUp(self):
-        self.weather_agent = WeatherAgent()
+    @classmethod
+    def setUpClass(cls):
+        # Agents keep no per-test state, so build them once per class
+        cls.weather_agent = WeatherAgent()
     
     def test_weather_agent_initialization(self):
         """Test that WeatherAgent initializes correctly"""
@@ -33,30 +48,231 @@ class TestWeatherAgent(unittest.TestCase):
         self.assertIn("data", result)
         self.assertIn("confidence", result)
     
-    @patch('requests.get')
-    def test_get_current_weather(self, mock_get):
+    @patch('agents.weather_agent.Config.WEATHER_API_KEY', "")
+    def test_mock_weather_is_not_shared(self):
+        """Test that editing the fallback weather does not change later responses"""
+        self.weather_agent.get_current_weather("Delhi")["temperature"] = -99
+        self.weather_agent.get_weather_forecast("Delhi")["forecast"][0]["temperature"] = -99
+        
+        self.assertEqual(self.weather_agent.get_current_weather("Delhi")["temperature"], 28.5)
+        self.assertEqual(asyncio.run(self.weather_agent.aget_current_weather("Delhi"))["temperature"], 28.5)
+        self.assertEqual(self.weather_agent.get_weather_forecast("Delhi")["forecast"][0]["temperature"], 28.5)
+    
+    def test_irrigation_horizon_plan(self):
+        """Test that each forecast interval gets its own irrigation priority"""
+        forecast = {"forecast": [
+            {"time": "2024-06-01 06:00:00", "temperature": 22, "humidity": 80},
+            {"time": "2024-06-01 12:00:00", "temperature": 28, "humidity": 55},
+            {"time": "2024-06-01 15:00:00", "temperature": 34, "humidity": 40},
+            {"time": "2024-06-01 18:00:00", "temperature": 34, "humidity": 55}
+        ]}
+        
+        plan = self.weather_agent.plan_irrigation_horizon(forecast)
+        
+        self.assertEqual([step["time"] for step in plan], [step["time"] for step in forecast["forecast"]])
+        self.assertEqual([step["priority"] for step in plan], ["Low", "Medium", "High", "Medium"])
+        self.assertEqual(plan[2]["recommendation"], "High irrigation needed - high temperature and low humidity")
+        self.assertEqual(self.weather_agent.plan_irrigation_horizon({}), [])
+    
+    @patch.dict('agents.weather_agent.WeatherAgent._city_ids', {})
+    def test_invalidated_location_is_refetched(self):
+        """Test that cached weather is reused until the location is invalidated"""
+        async def fake_get_json(url, params, gate=None):
+            entry = _weather_entry(99, temp=31)
+            return {"list": [entry]} if url.endswith("/group") else entry
+        
+        get_json = AsyncMock(side_effect=fake_get_json)
+        
+        async def lookup():
+            return await self.weather_agent.aget_current_weather("Testville")
+        
+        with patch('agents.weather_agent._aget_json', get_json), \
+             patch('agents.weather_agent.Config.WEATHER_API_KEY', "test-key"), \
+             patch.object(WeatherAgent, '_group_batcher', _GroupBatcher()):
+            asyncio.run(lookup())
+            asyncio.run(lookup())
+            self.assertEqual(get_json.await_count, 1)
+            
+            WeatherAgent.invalidate_cache("Testville")
+            result = asyncio.run(lookup())
+        WeatherAgent.invalidate_cache("Testville")
+        
+        # The refetch goes through /group now that the city id is known
+        self.assertEqual(get_json.await_count, 2)
+        self.assertTrue(get_json.await_args.args[0].endswith("/group"))
+        self.assertEqual(result["temperature"], 31)
+    
+    @patch('agents.weather_agent.Config.WEATHER_API_KEY', "test-key")
+    @patch('agents.weather_agent.WeatherAgent._session')
+    def test_get_current_weather(self, mock_session):
         """Test current weather data retrieval"""
+        WeatherAgent.invalidate_cache("Mumbai")
+        self.addCleanup(WeatherAgent.invalidate_cache, "Mumbai")
+        
         # Mock successful API response
         mock_response = Mock()
-        mock_response.json.return_value = {
+        mock_response.content = orjson.dumps({
             "main": {"temp": 25, "humidity": 60, "pressure": 1013},
             "weather": [{"description": "clear sky"}],
             "wind": {"speed": 5}
-        }
+        })
         mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_session.get.return_value = mock_response
         
         weather_data = self.weather_agent.get_current_weather("Mumbai")
         
         self.assertIn("temperature", weather_data)
         self.assertIn("humidity", weather_data)
         self.assertEqual(weather_data["temperature"], 25)
+        mock_session.get.assert_called_once()
+        self.assertIn("timeout", mock_session.get.call_args.kwargs)
+
+def _weather_entry(city_id, temp=25):
+    """Raw OpenWeather /weather-shaped entry for a city"""
+    return {
+        "id": city_id,
+        "main": {"temp": temp, "humidity": 60, "pressure": 1013},
+        "weather": [{"description": "clear sky"}],
+        "wind": {"speed": 5}
+    }
+
+class TestGroupBatcher(unittest.TestCase):
+    """Test cases for batching current-weather lookups into /group calls"""
+    
+    def setUp(self):
+        self.calls = []
+        self.omit = set()
+        self.fail_group = False
+    
+    async def fake_get_json(self, url, params, gate=None):
+        self.calls.append((url.rsplit("/", 1)[-1], params))
+        if url.endswith("/group"):
+            if self.fail_group:
+                raise RuntimeError("group unavailable")
+            ids = [int(city_id) for city_id in params["id"].split(",")]
+            return {"list": [_weather_entry(city_id) for city_id in ids if city_id not in self.omit]}
+        return _weather_entry(99, temp=31)
+    
+    def fetch_all(self, city_ids):
+        batcher = _GroupBatcher()
+        
+        async def run_all():
+            return await asyncio.gather(*(batcher.fetch(city_id) for city_id in city_ids), return_exceptions=True)
+        
+        with patch('agents.weather_agent._aget_json', self.fake_get_json):
+            return asyncio.run(run_all())
+    
+    def test_concurrent_lookups_share_one_call(self):
+        """Test that concurrent lookups are sent as a single /group request"""
+        results = self.fetch_all([1, 2, 3, 2])
+        
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][1]["id"], "1,2,3")
+        self.assertEqual([result["id"] for result in results], [1, 2, 3, 2])
+    
+    def test_lookups_split_into_groups_of_twenty(self):
+        """Test that more than 20 cities are spread over several /group requests"""
+        results = self.fetch_all(list(range(1, 46)))
+        
+        self.assertEqual([len(params["id"].split(",")) for _, params in self.calls], [20, 20, 5])
+        self.assertEqual([result["id"] for result in results], list(range(1, 46)))
+    
+    def test_missing_city_fails_only_that_lookup(self):
+        """Test that a city left out of the response raises for its caller alone"""
+        self.omit = {2}
+        results = self.fetch_all([1, 2, 3])
+        
+        self.assertEqual(results[0]["id"], 1)
+        self.assertIsInstance(results[1], KeyError)
+        self.assertEqual(results[2]["id"], 3)
+    
+    def test_failed_group_call_fails_every_lookup(self):
+        """Test that a failing /group request is reported to every caller"""
+        self.fail_group = True
+        results = self.fetch_all([1, 2])
+        
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+    
+    @patch.dict('agents.weather_agent.WeatherAgent._city_ids', {"pune": 7})
+    def test_failed_group_call_falls_back_to_single_lookup(self):
+        """Test that the agent retries a city through /weather when /group fails"""
+        self.fail_group = True
+        agent = WeatherAgent()
+        
+        with patch('agents.weather_agent._aget_json', self.fake_get_json), \
+             patch('agents.weather_agent.Config.WEATHER_API_KEY', "test-key"), \
+             patch.object(WeatherAgent, '_group_batcher', _GroupBatcher()):
+            result = asyncio.run(agent.aget_current_weather("Pune"))
+        WeatherAgent.invalidate_cache("Pune")
+        
+        self.assertEqual([endpoint for endpoint, _ in self.calls], ["group", "weather"])
+        self.assertEqual(result["temperature"], 31)
+
+class _FakeResponse:
+    """Minimal aiohttp response stand-in for _aget_json"""
+    
+    def __init__(self, status, body=b"{}", headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        return False
+    
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+    
+    async def read(self):
+        return self._body
+
+class TestAgetJsonRetry(unittest.TestCase):
+    """Test cases for retrying rate-limited OpenWeather calls"""
+    
+    def run_with_responses(self, responses):
+        session = Mock()
+        session.get.side_effect = responses
+        delays = []
+        
+        async def fake_sleep(delay):
+            delays.append(delay)
+        
+        with patch('agents.weather_agent.get_http_session', return_value=session), \
+             patch('agents.weather_agent.asyncio.sleep', fake_sleep):
+            try:
+                result = asyncio.run(_aget_json("https://example.test/weather", {}))
+            except RuntimeError as e:
+                result = e
+        return result, session.get.call_count, delays
+    
+    def test_retries_after_rate_limit(self):
+        """Test that a 429 is retried after the server's Retry-After delay"""
+        result, calls, delays = self.run_with_responses([
+            _FakeResponse(429, headers={"Retry-After": "2"}),
+            _FakeResponse(200, b'{"ok": true}')
+        ])
+        
+        self.assertEqual(result, {"ok": True})
+        self.assertEqual(calls, 2)
+        self.assertEqual(delays, [2.0])
+    
+    def test_gives_up_after_retry_limit(self):
+        """Test that persistent 429s stop after the attempt limit with backoff in between"""
+        result, calls, delays = self.run_with_responses([_FakeResponse(429) for _ in range(5)])
+        
+        self.assertIsInstance(result, RuntimeError)
+        self.assertEqual(calls, 3)
+        self.assertEqual(delays, [0.2, 0.4])
 
 class TestCropAgent(unittest.TestCase):
     """Test cases for CropAgent"""
     
-    def setUp(self):
-        self.crop_agent = CropAgent()
+    @classmethod
+    def setUpClass(cls):
+        cls.crop_agent = CropAgent()
     
     def test_crop_agent_initialization(self):
         """Test that CropAgent initializes correctly"""
@@ -76,7 +292,7 @@ class TestCropAgent(unittest.TestCase):
             "Mumbai", "Alluvial", "Kharif"
         )
         
-        self.assertIsInstance(recommendations, list)
+        self.assertIsInstance(recommendations, tuple)
         if recommendations:
             self.assertIn("name", recommendations[0])
             self.assertIn("varieties", recommendations[0])
@@ -95,11 +311,29 @@ class TestCropAgent(unittest.TestCase):
         self.assertIn("Wheat", analysis)
         self.assertIn("suitability_score", analysis["Rice"])
 
+    def test_confidence_score_matches_whole_words(self):
+        """Test that confidence counts whole-word and multi-word keyword matches"""
+        self.assertEqual(self.crop_agent.get_confidence_score("How is the weather?"), 0.0)
+        self.assertGreater(self.crop_agent.get_confidence_score("Which crop should I plant?"), 0.0)
+        self.assertGreater(
+            self.crop_agent.get_confidence_score("फसल काटना कब करें?"),
+            self.crop_agent.get_confidence_score("फसल कब करें?")
+        )
+
+    def test_edited_results_do_not_leak(self):
+        """Test that editing a returned record does not change later results"""
+        self.crop_agent.get_crop_recommendations("Mumbai", "Alluvial", "Kharif")[0]["name"] = "Changed"
+        self.crop_agent.get_crop_calendar("Kharif")["planting_start"] = "Changed"
+        
+        self.assertEqual(self.crop_agent.get_crop_recommendations("Mumbai", "Alluvial", "Kharif")[0]["name"], "Rice")
+        self.assertEqual(self.crop_agent.get_crop_calendar("Kharif")["planting_start"], "June")
+
 class TestFinanceAgent(unittest.TestCase):
     """Test cases for FinanceAgent"""
     
-    def setUp(self):
-        self.finance_agent = FinanceAgent()
+    @classmethod
+    def setUpClass(cls):
+        cls.finance_agent = FinanceAgent()
     
     def test_finance_agent_initialization(self):
         """Test that FinanceAgent initializes correctly"""
@@ -117,7 +351,7 @@ class TestFinanceAgent(unittest.TestCase):
         """Test loan options retrieval"""
         loans = self.finance_agent.get_loan_options("small", 1.5, "Rice")
         
-        self.assertIsInstance(loans, list)
+        self.assertIsInstance(loans, tuple)
         if loans:
             self.assertIn("name", loans[0])
             self.assertIn("interest_rate", loans[0])
@@ -126,28 +360,298 @@ class TestFinanceAgent(unittest.TestCase):
         """Test government schemes retrieval"""
         schemes = self.finance_agent.get_government_schemes("Maharashtra", "small")
         
-        self.assertIsInstance(schemes, list)
+        self.assertIsInstance(schemes, tuple)
         if schemes:
             self.assertIn("name", schemes[0])
             self.assertIn("description", schemes[0])
 
+    def test_edited_results_do_not_leak(self):
+        """Test that editing a returned record does not change later results"""
+        self.finance_agent.get_loan_options("small", 1.0, "Rice")[0]["name"] = "Changed"
+        self.finance_agent.analyze_market_trends("Rice")["trend"] = "Changed"
+        
+        self.assertEqual(self.finance_agent.get_loan_options("small", 1.0, "Rice")[0]["name"], "Kisan Credit Card (KCC)")
+        self.assertEqual(self.finance_agent.analyze_market_trends("Rice")["trend"], "Stable")
+
+    def test_insurance_options_are_memoized_per_tenth_hectare(self):
+        """Test that nearby land areas share a cached result and each caller gets a copy"""
+        _insurance_options.cache_clear()
+        options = self.finance_agent.get_insurance_options("Rice", 2.04)
+        options[0]["sum_insured"] = "Changed"
+        repeat = self.finance_agent.get_insurance_options("Rice", 2.0)
+        
+        self.assertEqual(_insurance_options.cache_info().hits, 1)
+        self.assertEqual(repeat[0]["sum_insured"], "₹100,000")
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for AsyncLeakyBucket"""
+    
+    def test_reserve_consumes_capacity(self):
+        """Test that reservations draw down request and token budgets"""
+        bucket = AsyncLeakyBucket(rpm=60, tpm=1000)
+        
+        async def reserve_twice():
+            async with bucket.reserve(100):
+                pass
+            async with bucket.reserve(200):
+                pass
+        
+        asyncio.run(reserve_twice())
+        
+        self.assertLess(bucket._available_requests, 59)
+        self.assertLess(bucket._available_tokens, 701)
+    
+    def test_reserve_waits_for_several_requests(self):
+        """Test that a multi-request reservation waits until all of them are available"""
+        bucket = AsyncLeakyBucket(rpm=600, tpm=100000)
+        bucket._available_requests = 0
+        
+        async def reserve_three():
+            start = asyncio.get_running_loop().time()
+            async with bucket.reserve(100, requests=3):
+                return asyncio.get_running_loop().time() - start
+        
+        self.assertGreaterEqual(asyncio.run(reserve_three()), 0.25)
+    
+    def test_crew_kickoff_waits_for_limiter(self):
+        """Test that a comprehensive query reserves one request per task before kicking off the crew"""
+        crew = AgriculturalCrew()
+        events = []
+        release = None
+        
+        @asynccontextmanager
+        async def reserve(tokens, requests=1):
+            events.append(("reserve", requests))
+            await release.wait()
+            yield
+        
+        async def kickoff_async():
+            events.append("kickoff")
+            return "crew answer"
+        
+        agent = SimpleNamespace(backstory="Advisor")
+        fake_crew = SimpleNamespace(
+            tasks=[SimpleNamespace(description=f"Task {i}", agent=agent) for i in range(3)],
+            kickoff_async=kickoff_async
+        )
+        
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            sections = {}
+            async for section, value in crew.astream_comprehensive_query("Plan my season", {}):
+                sections[section] = value
+                if "mcp_data" in sections and "agent_insights" in sections and not release.is_set():
+                    # Both other sections are done while the crew is still held by the limiter
+                    self.assertEqual(events, [("reserve", 3)])
+                    release.set()
+            return sections
+        
+        with patch.object(crew.weather_agent, "llm", Mock()), \
+             patch.object(crew.weather_agent, "_bucket", Mock(reserve=reserve)), \
+             patch.object(crew, "_build_crew", return_value=fake_crew), \
+             patch.object(crew.mcp_provider, "get_comprehensive_data", new=AsyncMock(return_value={})), \
+             patch.object(crew, "_get_agent_insights", new=AsyncMock(return_value={})):
+            sections = asyncio.run(run())
+        
+        self.assertEqual(events, [("reserve", 3), "kickoff"])
+        self.assertEqual(sections["crew_result"], "crew answer")
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for TTLCache"""
+    
+    def test_entries_expire_and_evict(self):
+        """Test that entries expire after their TTL and the oldest are evicted when full"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        cache.set("d", 4, ttl=0)
+        
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.get("c"), 3)
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for SingleFlight"""
+    
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that concurrent callers for the same key share a single call"""
+        flight = SingleFlight()
+        calls = []
+        
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "data"
+        
+        async def run_all():
+            return await asyncio.gather(*(flight.do("Mumbai", fetch) for _ in range(5)))
+        
+        results = asyncio.run(run_all())
+        
+        self.assertEqual(results, ["data"] * 5)
+        self.assertEqual(len(calls), 1)
+
+class TestSemanticCache(unittest.TestCase):
+    """Test cases for SemanticCache"""
+    
+    EMBEDDINGS = {
+        "When should I irrigate?": [1.0, 0.0],
+        "When should I water my crop?": [0.98, 0.2],
+        "Which loans are available?": [0.0, 1.0]
+    }
+    
+    def setUp(self):
+        async def embed(text):
+            return self.EMBEDDINGS[text]
+        
+        self.cache = SemanticCache(embed, threshold=0.9, ttl=60)
+        self.calls = []
+    
+    def lookup(self, namespace, text, **kwargs):
+        async def compute():
+            self.calls.append(text)
+            return {"answer": text}
+        
+        return asyncio.run(self.cache.get_or_compute(namespace, text, compute, **kwargs))
+    
+    def test_similar_query_hits(self):
+        """Test that a query above the similarity threshold reuses the stored answer"""
+        self.lookup("en", "When should I irrigate?")
+        result = self.lookup("en", "When should I water my crop?")
+        
+        self.assertEqual(result, {"answer": "When should I irrigate?"})
+        self.assertEqual(len(self.calls), 1)
+    
+    def test_dissimilar_query_misses(self):
+        """Test that a query below the similarity threshold is computed"""
+        self.lookup("en", "When should I irrigate?")
+        result = self.lookup("en", "Which loans are available?")
+        
+        self.assertEqual(result, {"answer": "Which loans are available?"})
+        self.assertEqual(len(self.calls), 2)
+    
+    def test_namespaces_are_isolated(self):
+        """Test that identical queries in different namespaces do not share answers"""
+        self.lookup("en", "When should I irrigate?")
+        self.lookup("hi", "When should I irrigate?")
+        
+        self.assertEqual(len(self.calls), 2)
+    
+    def test_entries_expire(self):
+        """Test that expired entries are recomputed and per-answer TTLs apply"""
+        self.lookup("en", "When should I irrigate?", ttl_for=lambda answer: 0)
+        self.lookup("en", "When should I irrigate?")
+        self.lookup("en", "When should I irrigate?")
+        
+        self.assertEqual(len(self.calls), 2)
+    
+    def test_size_is_bounded_across_namespaces(self):
+        """Test that maxsize caps entries over all namespaces, evicting the least recently used"""
+        self.cache.maxsize = 2
+        self.lookup("a", "When should I irrigate?")
+        self.lookup("b", "When should I irrigate?")
+        self.lookup("a", "When should I irrigate?")
+        self.lookup("c", "When should I irrigate?")
+        self.lookup("a", "When should I irrigate?")
+        self.lookup("b", "When should I irrigate?")
+        
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.calls.count("When should I irrigate?"), 4)
+
+class TestMCPClient(unittest.TestCase):
+    """Test cases for MCP data caching and bulk requests"""
+    
+    def setUp(self):
+        _data_cache.clear()
+        self.requests = []
+        patcher = patch.object(MCPClient, '_request', self.fake_request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(_data_cache.clear)
+    
+    async def fake_request(self, method, path, params=None, json=None):
+        self.requests.append((method, path, (params or {}).get("type")))
+        await asyncio.sleep(0.01)
+        if path == "/data/bulk":
+            return {
+                "weather": {"temperature": 32},
+                "soil": {"ph": 6.5},
+                "market": {"trend": "Rising"},
+                "policy": [{"name": "PM-KISAN"}]
+            }
+        if path == "/data" and params["type"] == "policy":
+            return [{"name": "PM-KISAN"}]
+        return {"type": (params or {}).get("type", path)}
+    
+    def test_cached_within_kind_ttl(self):
+        """Test that repeated lookups are served from cache until their kind's TTL lapses"""
+        client = MCPClient()
+        
+        async def lookups():
+            await client.get_weather_data("Pune")
+            await client.get_weather_data("Pune")
+            await client.get_market_data("Rice")
+            await client.get_market_data("Rice")
+        
+        asyncio.run(lookups())
+        self.assertEqual(len(self.requests), 2)
+        
+        with patch.dict('mcp.mcp_client._CACHE_TTLS', {"weather": 0}):
+            _data_cache.clear()
+            asyncio.run(lookups())
+        self.assertEqual([kind for _, _, kind in self.requests[2:]], ["weather", "weather", "market"])
+    
+    def test_concurrent_lookups_share_one_request(self):
+        """Test that concurrent identical lookups are de-duplicated"""
+        client = MCPClient()
+        
+        async def run_all():
+            return await asyncio.gather(*(client.get_soil_data("Pune") for _ in range(5)))
+        
+        results = asyncio.run(run_all())
+        
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(results, [{"type": "soil"}] * 5)
+        results[0]["type"] = "changed"
+        self.assertEqual(asyncio.run(client.get_soil_data("Pune")), {"type": "soil"})
+    
+    @patch('mcp.mcp_client.Config.MCP_BULK_DATA', True)
+    def test_bulk_opt_in_uses_single_request(self):
+        """Test that MCP_BULK_DATA fetches every kind with one POST /data/bulk"""
+        provider = MCPDataProvider()
+        
+        async def fetch_twice():
+            await provider.initialize()
+            first = await provider.get_comprehensive_data("Pune", "Rice", "Maharashtra")
+            second = await provider.get_comprehensive_data("Pune", "Rice", "Maharashtra")
+            return first, second
+        
+        first, second = asyncio.run(fetch_twice())
+        data_requests = [(method, path) for method, path, _ in self.requests if path != "/initialize"]
+        
+        self.assertEqual(data_requests, [("POST", "/data/bulk")])
+        self.assertEqual(set(first), {"weather", "soil", "market", "policies"})
+        self.assertEqual(first["policies"], [{"name": "PM-KISAN"}])
+        self.assertEqual(first, second)
+
 class TestLanguageProcessor(unittest.TestCase):
     """Test cases for LanguageProcessor"""
     
-    def setUp(self):
-        self.language_processor = LanguageProcessor()
+    @classmethod
+    def setUpClass(cls):
+        cls.language_processor = LanguageProcessor()
     
     def test_language_detection(self):
         """Test language detection"""
-        # Test Hindi
-        hindi_text = "मौसम कैसा है?"
-        detected_lang = self.language_processor.detect_language(hindi_text)
-        self.assertEqual(detected_lang, "hi")
-        
-        # Test English
-        english_text = "How is the weather?"
-        detected_lang = self.language_processor.detect_language(english_text)
-        self.assertEqual(detected_lang, "en")
+        cases = [
+            ("मौसम कैसा है?", "hi"),
+            ("How is the weather?", "en")
+        ]
+        for text, expected_lang in cases:
+            with self.subTest(text=text):
+                self.assertEqual(self.language_processor.detect_language(text), expected_lang)
     
     def test_query_classification(self):
         """Test query type classification"""
@@ -181,11 +685,12 @@ class TestLanguageProcessor(unittest.TestCase):
 class TestIntegration(unittest.TestCase):
     """Integration tests for the complete system"""
     
-    def setUp(self):
-        self.weather_agent = WeatherAgent()
-        self.crop_agent = CropAgent()
-        self.finance_agent = FinanceAgent()
-        self.language_processor = LanguageProcessor()
+    @classmethod
+    def setUpClass(cls):
+        cls.weather_agent = WeatherAgent()
+        cls.crop_agent = CropAgent()
+        cls.finance_agent = FinanceAgent()
+        cls.language_processor = LanguageProcessor()
     
     def test_end_to_end_query_processing(self):
         """Test end-to-end query processing"""
@@ -209,6 +714,131 @@ class TestIntegration(unittest.TestCase):
         self.assertIn("success", result)
         self.assertIn("data", result)
 
+    def test_concurrent_async_query_processing(self):
+        """Test that agents can be awaited concurrently"""
+        query = "What should I plant and how can I finance it?"
+        context = {"location": "Mumbai", "soil_type": "Alluvial", "season": "Kharif"}
+
+        async def run_all():
+            return await asyncio.gather(
+                self.weather_agent.aprocess_query(query, context),
+                self.crop_agent.aprocess_query(query, context),
+                self.finance_agent.aprocess_query(query, context)
+            )
+
+        results = asyncio.run(run_all())
+
+        self.assertEqual([r["source"] for r in results], ["Weather Agent", "Crop Agent", "Finance Agent"])
+        for result in results:
+            self.assertIn("success", result)
+            self.assertIn("data", result)
+
+    def test_streamed_query_sections(self):
+        """Test that streamed sections add up to the full response data"""
+        query = "When should I irrigate?"
+        context = {"location": "Mumbai"}
+
+        async def collect():
+            return [section async for section in self.weather_agent.astream_query(query, context)]
+
+        sections = asyncio.run(collect())
+        names = [name for name, _ in sections]
+
+        self.assertCountEqual(names[:2], ["current_weather", "forecast"])
+        self.assertEqual(names[2:], ["irrigation_recommendation", "timestamp"])
+
+    def test_batched_query_processing(self):
+        """Test that batched queries return one result per query in order"""
+        queries = [
+            ("Which crop should I plant?", {"soil_type": "Alluvial", "season": "Kharif"}),
+            ("Which crop suits black soil?", {"soil_type": "Black", "season": "Rabi"})
+        ]
+
+        results = asyncio.run(self.crop_agent.aprocess_queries(queries))
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["data"]["recommendations"][0]["name"], "Rice")
+        self.assertEqual(results[1]["data"]["recommendations"][0]["name"], "Chickpea")
+
+    def test_crop_then_finance_shares_one_llm_call(self):
+        """Test that one LLM reply supplies advice for both the crop and finance results"""
+        crop_agent, finance_agent = CropAgent(), FinanceAgent()
+        crop_agent.llm = Mock()
+        reply = '{"crop_plan": "Grow rice", "finance_plan": "Use a Kisan Credit Card"}'
+        context = {"soil_type": "Alluvial", "season": "Kharif"}
+
+        with patch.object(crop_agent, "ainvoke_llm", new=AsyncMock(return_value=reply)) as ainvoke_llm:
+            results = asyncio.run(crop_then_finance("What should I grow and how do I fund it?", context,
+                                                    crop_agent=crop_agent, finance_agent=finance_agent))
+
+        ainvoke_llm.assert_awaited_once()
+        self.assertIn('"crop_type":"Rice"', ainvoke_llm.await_args.args[0])
+        self.assertEqual(results["crop"]["data"]["advice"], "Grow rice")
+        self.assertEqual(results["finance"]["data"]["advice"], "Use a Kisan Credit Card")
+
+class TestSimpleQueryRouting(unittest.TestCase):
+    """Test how simple queries are routed to agents"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.crew = AgriculturalCrew()
+
+    def test_unmatched_query_falls_back_to_router(self):
+        """Test that a query matching no keywords is answered without an agent"""
+        with patch.object(self.crew.weather_agent, "aprocess_query", new=AsyncMock()) as weather:
+            result = asyncio.run(self.crew.process_simple_query("hello there"))
+
+        weather.assert_not_awaited()
+        self.assertEqual(result["source"], "Router")
+        self.assertEqual(result["confidence"], 0.0)
+        self.assertEqual(result["data"]["topics"], ["weather", "crop", "finance"])
+
+    def test_tied_agents_are_merged(self):
+        """Test that equally relevant agents all answer and their results are merged"""
+        weather = {"success": False, "data": {}, "confidence": 0.4, "source": "Weather Agent"}
+        crop = {"success": True, "data": {}, "confidence": 0.7, "source": "Crop Agent"}
+        keywords = {'weather': ('x',), 'crop': ('x',), 'finance': ('y',)}
+
+        with patch.object(self.crew, "_agent_keywords", keywords), \
+             patch.object(self.crew.weather_agent, "aprocess_query", new=AsyncMock(return_value=weather)), \
+             patch.object(self.crew.crop_agent, "aprocess_query", new=AsyncMock(return_value=crop)), \
+             patch.object(self.crew.finance_agent, "aprocess_query", new=AsyncMock()) as finance:
+            result = asyncio.run(self.crew.process_simple_query("x"))
+
+        finance.assert_not_awaited()
+        self.assertTrue(result["success"])
+        self.assertEqual(result["source"], "Weather Agent + Crop Agent")
+        self.assertEqual(result["confidence"], 0.7)
+        self.assertEqual(list(result["data"]), ["weather", "crop"])
+
+class TestStaticEndpoints(unittest.TestCase):
+    """Test cases for the cacheable static API endpoints"""
+    
+    @classmethod
+    def setUpClass(cls):
+        from api.main import app
+        # Not entered as a context manager, so the lifespan (database setup) is skipped
+        cls.client = TestClient(app)
+    
+    def test_cache_headers_and_revalidation(self):
+        """Test that static endpoints send validators and answer matching If-None-Match with 304"""
+        response = self.client.get("/crops")
+        etag = response.headers["ETag"]
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Cache-Control"], "public, max-age=3600")
+        self.assertIn("crops", response.json())
+        
+        for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            with self.subTest(if_none_match=if_none_match):
+                revalidated = self.client.get("/crops", headers={"If-None-Match": if_none_match})
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated.headers["ETag"], etag)
+                self.assertEqual(revalidated.content, b"")
+        
+        changed = self.client.get("/crops", headers={"If-None-Match": '"other"'})
+        self.assertEqual(changed.status_code, 200)
+
 if __name__ == "__main__":
     # Run the tests
     unittest.main(verbosity=2) 
\ No newline at end of file
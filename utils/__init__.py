@@ -1,3 +1,8 @@
+from .embedding_batcher import EmbeddingBatcher
 from .language_processor import LanguageProcessor
+from .semantic_cache import SemanticCache
+from .single_flight import SingleFlight
+from .timestamps import now_iso
+from .ttl_cache import TTLCache
 
-__all__ = ['LanguageProcessor'] 
\ No newline at end of file
+__all__ = ['EmbeddingBatcher', 'LanguageProcessor', 'SemanticCache', 'SingleFlight', 'TTLCache', 'now_iso'] 
\ No newline at end of file
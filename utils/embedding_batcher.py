@@ -0,0 +1,59 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+class EmbeddingBatcher:
+    """Coalesce concurrent single-text embedding requests into batched calls
+
+    The first request in a window schedules a flush; every request that arrives
+    before it joins the same batch, so N concurrent queries cost one embeddings
+    round trip (per max_batch texts) instead of N. Identical texts in a window
+    share one result.
+    """
+
+    def __init__(self, embed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 window: float = 0.02, max_batch: int = 64):
+        self._embed_many = embed_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Return the embedding for text, batched with concurrent requests"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending = {}
+            self._loop = loop
+
+        future = self._pending.get(text)
+        if future is None:
+            if not self._pending:
+                loop.call_later(self.window, self._start_flush)
+            future = self._pending[text] = loop.create_future()
+        # Shielded so one cancelled caller does not fail the others sharing the text
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        self._flush_task = self._loop.create_task(self._flush())
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        texts = list(pending)
+        await asyncio.gather(*(
+            self._embed_batch(texts[start:start + self.max_batch], pending)
+            for start in range(0, len(texts), self.max_batch)
+        ))
+
+    async def _embed_batch(self, texts: List[str], pending: Dict[str, asyncio.Future]):
+        try:
+            vectors = await self._embed_many(texts)
+        except Exception as e:
+            for text in texts:
+                if not pending[text].done():
+                    pending[text].set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            if not pending[text].done():
+                pending[text].set_result(vector)
@@ -1,34 +1,186 @@
 import re
+from types import MappingProxyType
 from typing import Dict, Any, List, Tuple
 from config import Config
 
+# Lookup tables are built once at import rather than on every call
+_LANGUAGE_PATTERNS = MappingProxyType({
+    "hi": {
+        "weather_keywords": ["मौसम", "बारिश", "तापमान", "सिंचाई", "पानी", "नमी"],
+        "crop_keywords": ["फसल", "बीज", "किस्म", "रोपण", "फसल काटना", "उपज"],
+        "finance_keywords": ["ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना"],
+        "greetings": ["नमस्ते", "स्वागत है", "कैसे हैं"],
+        "questions": ["क्या", "कब", "कहाँ", "कैसे", "क्यों"]
+    },
+    "ta": {
+        "weather_keywords": ["வானிலை", "மழை", "வெப்பநிலை", "நீர்ப்பாசனம்", "தண்ணீர்", "ஈரப்பதம்"],
+        "crop_keywords": ["பயிர்", "விதை", "வகை", "நடவு", "அறுவடை", "மகசூல்"],
+        "finance_keywords": ["கடன்", "கடன்", "நிதி", "பணம்", "வங்கி", "திட்டம்"],
+        "greetings": ["வணக்கம்", "வரவேற்கிறோம்", "எப்படி இருக்கிறீர்கள்"],
+        "questions": ["என்ன", "எப்போது", "எங்கே", "எப்படி", "ஏன்"]
+    },
+    "te": {
+        "weather_keywords": ["వాతావరణం", "వర్షం", "ఉష్ణోగ్రత", "నీటి తడుపుదల", "నీరు", "తేమ"],
+        "crop_keywords": ["పంట", "విత్తనం", "రకం", "నాటడం", "పంట కోత", "పంట"],
+        "finance_keywords": ["రుణం", "క్రెడిట్", "ఆర్థిక", "డబ్బు", "బ్యాంక్", "పథకం"],
+        "greetings": ["నమస్కారం", "స్వాగతం", "ఎలా ఉన్నారు"],
+        "questions": ["ఏమి", "ఎప్పుడు", "ఎక్కడ", "ఎలా", "ఎందుకు"]
+    }
+})
+
+_ENGLISH_KEYWORDS = (
+    "weather", "rain", "temperature", "irrigation", "water", "humidity",
+    "crop", "seed", "variety", "plant", "harvest", "yield",
+    "loan", "credit", "finance", "money", "bank", "scheme"
+)
+
+_WEATHER_TERMS = frozenset([
+    "weather", "rain", "temperature", "irrigation", "water", "humidity",
+    "मौसम", "बारिश", "तापमान", "सिंचाई", "पानी", "नमी",
+    "வானிலை", "மழை", "வெப்பநிலை", "நீர்ப்பாசனம்", "தண்ணீர்", "ஈரப்பதம்",
+    "వాతావరణం", "వర్షం", "ఉష్ణోగ్రత", "నీటి తడుపుదల", "నీరు", "తేమ"
+])
+
+_CROP_TERMS = frozenset([
+    "crop", "seed", "variety", "plant", "harvest", "yield",
+    "फसल", "बीज", "किस्म", "रोपण", "फसल काटना", "उपज",
+    "பயிர்", "விதை", "வகை", "நடவு", "அறுவடை", "மகசூல்",
+    "పంట", "విత్తనం", "రకం", "నాటడం", "పంట కోత", "పంట"
+])
+
+_FINANCE_TERMS = frozenset([
+    "loan", "credit", "finance", "money", "bank", "scheme",
+    "ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना",
+    "கடன்", "கடன்", "நிதி", "பணம்", "வங்கி", "திட்டம்",
+    "రుణం", "క్రెడిట్", "ఆర్థిక", "డబ్బు", "బ్యాంక్", "పథకం"
+])
+
+# Common Indian cities and states
+_LOCATIONS = MappingProxyType({
+    "mumbai": "Mumbai",
+    "delhi": "Delhi",
+    "bangalore": "Bangalore",
+    "chennai": "Chennai",
+    "kolkata": "Kolkata",
+    "hyderabad": "Hyderabad",
+    "pune": "Pune",
+    "ahmedabad": "Ahmedabad",
+    "jaipur": "Jaipur",
+    "lucknow": "Lucknow",
+    "patna": "Patna",
+    "bhopal": "Bhopal",
+    "chandigarh": "Chandigarh",
+    "guwahati": "Guwahati",
+    "shillong": "Shillong",
+    "imphal": "Imphal",
+    "aizawl": "Aizawl",
+    "kohima": "Kohima",
+    "itanagar": "Itanagar",
+    "gangtok": "Gangtok",
+    "agartala": "Agartala",
+    "dispur": "Dispur",
+    "shimla": "Shimla",
+    "dehradun": "Dehradun",
+    "srinagar": "Srinagar",
+    "leh": "Leh",
+    "port blair": "Port Blair",
+    "kavaratti": "Kavaratti",
+    "daman": "Daman",
+    "diu": "Diu",
+    "panaji": "Panaji",
+    "silvassa": "Silvassa",
+    "puducherry": "Puducherry",
+    "karnataka": "Karnataka",
+    "maharashtra": "Maharashtra",
+    "tamil nadu": "Tamil Nadu",
+    "andhra pradesh": "Andhra Pradesh",
+    "telangana": "Telangana",
+    "kerala": "Kerala",
+    "gujarat": "Gujarat",
+    "rajasthan": "Rajasthan",
+    "madhya pradesh": "Madhya Pradesh",
+    "uttar pradesh": "Uttar Pradesh",
+    "bihar": "Bihar",
+    "west bengal": "West Bengal",
+    "odisha": "Odisha",
+    "jharkhand": "Jharkhand",
+    "chhattisgarh": "Chhattisgarh",
+    "himachal pradesh": "Himachal Pradesh",
+    "uttarakhand": "Uttarakhand",
+    "punjab": "Punjab",
+    "haryana": "Haryana",
+    "assam": "Assam",
+    "manipur": "Manipur",
+    "meghalaya": "Meghalaya",
+    "mizoram": "Mizoram",
+    "nagaland": "Nagaland",
+    "arunachal pradesh": "Arunachal Pradesh",
+    "sikkim": "Sikkim",
+    "tripura": "Tripura",
+    "goa": "Goa",
+    "jammu and kashmir": "Jammu and Kashmir",
+    "ladakh": "Ladakh",
+    "andaman and nicobar": "Andaman and Nicobar",
+    "lakshadweep": "Lakshadweep",
+    "dadra and nagar haveli": "Dadra and Nagar Haveli",
+    "daman and diu": "Daman and Diu",
+    "puducherry": "Puducherry"
+})
+
+_CROPS = MappingProxyType({
+    "rice": "Rice",
+    "wheat": "Wheat",
+    "maize": "Maize",
+    "cotton": "Cotton",
+    "sugarcane": "Sugarcane",
+    "pulses": "Pulses",
+    "oilseeds": "Oilseeds",
+    "vegetables": "Vegetables",
+    "fruits": "Fruits",
+    "spices": "Spices",
+    "चावल": "Rice",
+    "गेहूं": "Wheat",
+    "मक्का": "Maize",
+    "कपास": "Cotton",
+    "गन्ना": "Sugarcane",
+    "दालें": "Pulses",
+    "तिलहन": "Oilseeds",
+    "सब्जियां": "Vegetables",
+    "फल": "Fruits",
+    "मसाले": "Spices"
+})
+
+# Simple keyword-based translation for common agricultural terms
+_TRANSLATIONS = MappingProxyType({
+    "hi": {
+        "weather": "मौसम",
+        "crop": "फसल",
+        "irrigation": "सिंचाई",
+        "loan": "ऋण",
+        "scheme": "योजना",
+        "recommendation": "सिफारिश",
+        "temperature": "तापमान",
+        "rainfall": "वर्षा",
+        "humidity": "नमी"
+    },
+    "ta": {
+        "weather": "வானிலை",
+        "crop": "பயிர்",
+        "irrigation": "நீர்ப்பாசனம்",
+        "loan": "கடன்",
+        "scheme": "திட்டம்",
+        "recommendation": "பரிந்துரை",
+        "temperature": "வெப்பநிலை",
+        "rainfall": "மழை",
+        "humidity": "ஈரப்பதம்"
+    }
+})
+
 class LanguageProcessor:
     """Process multilingual agricultural queries and responses"""
     
     def __init__(self):
-        self.language_patterns = {
-            "hi": {
-                "weather_keywords": ["मौसम", "बारिश", "तापमान", "सिंचाई", "पानी", "नमी"],
-                "crop_keywords": ["फसल", "बीज", "किस्म", "रोपण", "फसल काटना", "उपज"],
-                "finance_keywords": ["ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना"],
-                "greetings": ["नमस्ते", "स्वागत है", "कैसे हैं"],
-                "questions": ["क्या", "कब", "कहाँ", "कैसे", "क्यों"]
-            },
-            "ta": {
-                "weather_keywords": ["வானிலை", "மழை", "வெப்பநிலை", "நீர்ப்பாசனம்", "தண்ணீர்", "ஈரப்பதம்"],
-                "crop_keywords": ["பயிர்", "விதை", "வகை", "நடவு", "அறுவடை", "மகசூல்"],
-                "finance_keywords": ["கடன்", "கடன்", "நிதி", "பணம்", "வங்கி", "திட்டம்"],
-                "greetings": ["வணக்கம்", "வரவேற்கிறோம்", "எப்படி இருக்கிறீர்கள்"],
-                "questions": ["என்ன", "எப்போது", "எங்கே", "எப்படி", "ஏன்"]
-            },
-            "te": {
-                "weather_keywords": ["వాతావరణం", "వర్షం", "ఉష్ణోగ్రత", "నీటి తడుపుదల", "నీరు", "తేమ"],
-                "crop_keywords": ["పంట", "విత్తనం", "రకం", "నాటడం", "పంట కోత", "పంట"],
-                "finance_keywords": ["రుణం", "క్రెడిట్", "ఆర్థిక", "డబ్బు", "బ్యాంక్", "పథకం"],
-                "greetings": ["నమస్కారం", "స్వాగతం", "ఎలా ఉన్నారు"],
-                "questions": ["ఏమి", "ఎప్పుడు", "ఎక్కడ", "ఎలా", "ఎందుకు"]
-            }
-        }
+        self.language_patterns = _LANGUAGE_PATTERNS
     
     def detect_language(self, text: str) -> str:
         """Detect the language of the input text"""
@@ -55,13 +207,7 @@ class LanguageProcessor:
                         keywords.append(word)
         
         # Add English keywords as fallback
-        english_keywords = [
-            "weather", "rain", "temperature", "irrigation", "water", "humidity",
-            "crop", "seed", "variety", "plant", "harvest", "yield",
-            "loan", "credit", "finance", "money", "bank", "scheme"
-        ]
-        
-        for word in english_keywords:
+        for word in _ENGLISH_KEYWORDS:
             if word.lower() in text_lower:
                 keywords.append(word)
         
@@ -71,26 +217,9 @@ class LanguageProcessor:
         """Classify the type of agricultural query"""
         keywords = self.extract_keywords(text, language)
         
-        weather_count = sum(1 for kw in keywords if kw in [
-            "weather", "rain", "temperature", "irrigation", "water", "humidity",
-            "मौसम", "बारिश", "तापमान", "सिंचाई", "पानी", "नमी",
-            "வானிலை", "மழை", "வெப்பநிலை", "நீர்ப்பாசனம்", "தண்ணீர்", "ஈரப்பதம்",
-            "వాతావరణం", "వర్షం", "ఉష్ణోగ్రత", "నీటి తడుపుదల", "నీరు", "తేమ"
-        ])
-        
-        crop_count = sum(1 for kw in keywords if kw in [
-            "crop", "seed", "variety", "plant", "harvest", "yield",
-            "फसल", "बीज", "किस्म", "रोपण", "फसल काटना", "उपज",
-            "பயிர்", "விதை", "வகை", "நடவு", "அறுவடை", "மகசூல்",
-            "పంట", "విత్తనం", "రకం", "నాటడం", "పంట కోత", "పంట"
-        ])
-        
-        finance_count = sum(1 for kw in keywords if kw in [
-            "loan", "credit", "finance", "money", "bank", "scheme",
-            "ऋण", "क्रेडिट", "वित्त", "पैसा", "बैंक", "योजना",
-            "கடன்", "கடன்", "நிதி", "பணம்", "வங்கி", "திட்டம்",
-            "రుణం", "క్రెడిట్", "ఆర్థిక", "డబ్బు", "బ్యాంక్", "పథకం"
-        ])
+        weather_count = sum(1 for kw in keywords if kw in _WEATHER_TERMS)
+        crop_count = sum(1 for kw in keywords if kw in _CROP_TERMS)
+        finance_count = sum(1 for kw in keywords if kw in _FINANCE_TERMS)
         
         if weather_count > crop_count and weather_count > finance_count:
             return "weather"
@@ -103,80 +232,8 @@ class LanguageProcessor:
     
     def extract_location(self, text: str) -> str:
         """Extract location information from text"""
-        # Common Indian cities and states
-        locations = {
-            "mumbai": "Mumbai",
-            "delhi": "Delhi",
-            "bangalore": "Bangalore",
-            "chennai": "Chennai",
-            "kolkata": "Kolkata",
-            "hyderabad": "Hyderabad",
-            "pune": "Pune",
-            "ahmedabad": "Ahmedabad",
-            "jaipur": "Jaipur",
-            "lucknow": "Lucknow",
-            "patna": "Patna",
-            "bhopal": "Bhopal",
-            "chandigarh": "Chandigarh",
-            "guwahati": "Guwahati",
-            "shillong": "Shillong",
-            "imphal": "Imphal",
-            "aizawl": "Aizawl",
-            "kohima": "Kohima",
-            "itanagar": "Itanagar",
-            "gangtok": "Gangtok",
-            "agartala": "Agartala",
-            "dispur": "Dispur",
-            "shimla": "Shimla",
-            "dehradun": "Dehradun",
-            "srinagar": "Srinagar",
-            "leh": "Leh",
-            "port blair": "Port Blair",
-            "kavaratti": "Kavaratti",
-            "daman": "Daman",
-            "diu": "Diu",
-            "panaji": "Panaji",
-            "silvassa": "Silvassa",
-            "puducherry": "Puducherry",
-            "karnataka": "Karnataka",
-            "maharashtra": "Maharashtra",
-            "tamil nadu": "Tamil Nadu",
-            "andhra pradesh": "Andhra Pradesh",
-            "telangana": "Telangana",
-            "kerala": "Kerala",
-            "gujarat": "Gujarat",
-            "rajasthan": "Rajasthan",
-            "madhya pradesh": "Madhya Pradesh",
-            "uttar pradesh": "Uttar Pradesh",
-            "bihar": "Bihar",
-            "west bengal": "West Bengal",
-            "odisha": "Odisha",
-            "jharkhand": "Jharkhand",
-            "chhattisgarh": "Chhattisgarh",
-            "himachal pradesh": "Himachal Pradesh",
-            "uttarakhand": "Uttarakhand",
-            "punjab": "Punjab",
-            "haryana": "Haryana",
-            "assam": "Assam",
-            "manipur": "Manipur",
-            "meghalaya": "Meghalaya",
-            "mizoram": "Mizoram",
-            "nagaland": "Nagaland",
-            "arunachal pradesh": "Arunachal Pradesh",
-            "sikkim": "Sikkim",
-            "tripura": "Tripura",
-            "goa": "Goa",
-            "jammu and kashmir": "Jammu and Kashmir",
-            "ladakh": "Ladakh",
-            "andaman and nicobar": "Andaman and Nicobar",
-            "lakshadweep": "Lakshadweep",
-            "dadra and nagar haveli": "Dadra and Nagar Haveli",
-            "daman and diu": "Daman and Diu",
-            "puducherry": "Puducherry"
-        }
-        
         text_lower = text.lower()
-        for location_key, location_value in locations.items():
+        for location_key, location_value in _LOCATIONS.items():
             if location_key in text_lower:
                 return location_value
         
@@ -184,31 +241,8 @@ class LanguageProcessor:
     
     def extract_crop_info(self, text: str) -> str:
         """Extract crop information from text"""
-        crops = {
-            "rice": "Rice",
-            "wheat": "Wheat",
-            "maize": "Maize",
-            "cotton": "Cotton",
-            "sugarcane": "Sugarcane",
-            "pulses": "Pulses",
-            "oilseeds": "Oilseeds",
-            "vegetables": "Vegetables",
-            "fruits": "Fruits",
-            "spices": "Spices",
-            "चावल": "Rice",
-            "गेहूं": "Wheat",
-            "मक्का": "Maize",
-            "कपास": "Cotton",
-            "गन्ना": "Sugarcane",
-            "दालें": "Pulses",
-            "तिलहन": "Oilseeds",
-            "सब्जियां": "Vegetables",
-            "फल": "Fruits",
-            "मसाले": "Spices"
-        }
-        
         text_lower = text.lower()
-        for crop_key, crop_value in crops.items():
+        for crop_key, crop_value in _CROPS.items():
             if crop_key in text_lower:
                 return crop_value
         
@@ -220,35 +254,9 @@ class LanguageProcessor:
         if target_language == "en":
             return response
         
-        # Simple keyword-based translation for common agricultural terms
-        translations = {
-            "hi": {
-                "weather": "मौसम",
-                "crop": "फसल",
-                "irrigation": "सिंचाई",
-                "loan": "ऋण",
-                "scheme": "योजना",
-                "recommendation": "सिफारिश",
-                "temperature": "तापमान",
-                "rainfall": "वर्षा",
-                "humidity": "नमी"
-            },
-            "ta": {
-                "weather": "வானிலை",
-                "crop": "பயிர்",
-                "irrigation": "நீர்ப்பாசனம்",
-                "loan": "கடன்",
-                "scheme": "திட்டம்",
-                "recommendation": "பரிந்துரை",
-                "temperature": "வெப்பநிலை",
-                "rainfall": "மழை",
-                "humidity": "ஈரப்பதம்"
-            }
-        }
-        
-        if target_language in translations:
+        if target_language in _TRANSLATIONS:
             translated = response
-            for eng, local in translations[target_language].items():
+            for eng, local in _TRANSLATIONS[target_language].items():
                 translated = translated.replace(eng, local)
             return translated
         
@@ -0,0 +1,125 @@
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+class SemanticCache:
+    """Reuse responses for near-duplicate queries instead of recomputing them
+
+    Queries are embedded and compared by cosine similarity against earlier
+    queries in the same namespace (language, mode, context...); a match above
+    the threshold returns the stored response. Entries expire after ttl
+    seconds (or the per-response ttl_for), and the cache holds at most
+    maxsize entries across all namespaces, evicting from the least recently
+    used namespace first.
+    """
+
+    def __init__(self, embed: Callable[[str], Awaitable[List[float]]],
+                 threshold: float = 0.92, ttl: float = 3600, maxsize: int = 1024):
+        self._embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # namespace -> (unit vectors as an n x d matrix, expiry times, values),
+        # ordered from least to most recently used
+        self._spaces: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    async def get_or_compute(self, namespace: Hashable, text: str,
+                             compute: Callable[[], Awaitable[Any]],
+                             cacheable: Callable[[Any], bool] = bool,
+                             ttl_for: Optional[Callable[[Any], float]] = None) -> Any:
+        """Return a cached response for a similar query, or compute and store one"""
+        try:
+            vector = self._normalize(await self._embed(text))
+        except Exception as e:
+            print(f"Error embedding query for semantic cache: {e}")
+            return await compute()
+
+        hit = self._search(namespace, vector)
+        if hit is not None:
+            return hit
+
+        value = await compute()
+        if cacheable(value):
+            self._add(namespace, vector, value, self.ttl if ttl_for is None else ttl_for(value))
+        return value
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._spaces.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _search(self, namespace: Hashable, vector: np.ndarray) -> Optional[Any]:
+        with self._lock:
+            space = self._live_space(namespace, time.monotonic())
+            if space is None:
+                return None
+            self._spaces.move_to_end(namespace)
+            vectors, _, values = space
+            scores = vectors @ vector
+            best = int(np.argmax(scores))
+            return values[best] if scores[best] >= self.threshold else None
+
+    def _add(self, namespace: Hashable, vector: np.ndarray, value: Any, ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            # Namespaces are unbounded (they include the request context), so
+            # drop every expired entry rather than only this namespace's
+            for other in list(self._spaces):
+                self._live_space(other, now)
+
+            space = self._spaces.get(namespace)
+            if space is None:
+                vectors, expires, values = np.empty((0, vector.size), dtype=np.float32), np.empty(0), []
+            else:
+                vectors, expires, values = space
+            self._spaces[namespace] = (
+                np.vstack((vectors, vector)),
+                np.append(expires, now + ttl),
+                values + [value]
+            )
+            self._spaces.move_to_end(namespace)
+            self._size += 1
+
+            while self._size > self.maxsize:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        """Drop the oldest entry of the least recently used namespace"""
+        namespace, (vectors, expires, values) = next(iter(self._spaces.items()))
+        if len(values) == 1:
+            del self._spaces[namespace]
+        else:
+            self._spaces[namespace] = (vectors[1:], expires[1:], values[1:])
+            self._spaces.move_to_end(namespace, last=False)
+        self._size -= 1
+
+    def _live_space(self, namespace: Hashable, now: float) -> Optional[tuple]:
+        """Return the namespace's unexpired entries, dropping expired ones"""
+        space = self._spaces.get(namespace)
+        if space is None:
+            return None
+        vectors, expires, values = space
+        live = expires > now
+        if not live.all():
+            self._size -= int(len(values) - live.sum())
+            if not live.any():
+                del self._spaces[namespace]
+                return None
+            vectors, expires = vectors[live], expires[live]
+            values = [value for value, alive in zip(values, live) if alive]
+            space = self._spaces[namespace] = (vectors, expires, values)
+        return space
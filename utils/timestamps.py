@@ -0,0 +1,15 @@
+import time
+from datetime import datetime
+from functools import lru_cache
+
+@lru_cache(maxsize=1)
+def _iso_for_second(second: int) -> str:
+    return datetime.fromtimestamp(second).isoformat()
+
+def now_iso() -> str:
+    """Current local time as ISO-8601 at one-second resolution
+
+    The string is formatted at most once per second and reused by every
+    caller within that second, which keeps formatting off the request path.
+    """
+    return _iso_for_second(int(time.time()))